@@ -0,0 +1,100 @@
+"""Measure login throughput and its effect on concurrent catalog reads.
+
+Runs a login storm from --logins threads while one reader keeps fetching
+the manga list, once per --workers setting (0 does not limit concurrent hashes).
+Reports logins per second, rejected logins and the read latency
+percentiles, so bounded hashing can be compared against unbounded
+hashing on the same machine.
+
+    python benchmarks/passwords.py --workers 0,2 --logins 8 --seconds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import create_app, init_database
+from src.models.user import db, User, Manga
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'benchmark-password'
+
+
+def build_app(database, workers, method):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+        'UPLOAD_FOLDER': os.path.join(os.path.dirname(database), 'uploads'),
+        'PASSWORD_HASH_METHOD': method,
+        'PASSWORD_HASH_WORKERS': workers,
+        'RATELIMIT_ENABLED': False,
+        'ADMISSION_ENABLED': False,
+        'SCHEDULER_ENABLED': False,
+    })
+    init_database(app)
+    with app.app_context():
+        if not User.query.filter_by(email=EMAIL).first():
+            user = User(username='bench', email=EMAIL)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.add_all(Manga(title=f'Manga {i}', arabic_title=f'مانجا {i}') for i in range(50))
+            db.session.commit()
+    return app
+
+
+def run(app, logins, seconds):
+    stop = threading.Event()
+    results = {'ok': 0, 'busy': 0, 'reads': []}
+    lock = threading.Lock()
+
+    def login():
+        client = app.test_client()
+        while not stop.is_set():
+            status = client.post('/api/auth/login', json={'email': EMAIL, 'password': PASSWORD}).status_code
+            with lock:
+                results['ok' if status == 200 else 'busy'] += 1
+
+    def read():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/api/manga/?per_page=20')
+            results['reads'].append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login) for _ in range(logins)] + [threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='0,2', help='comma separated PASSWORD_HASH_WORKERS values to compare')
+    parser.add_argument('--logins', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--method', default='scrypt:32768:8:1', help='PASSWORD_HASH_METHOD')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        database = os.path.join(folder, 'bench.db')
+        print(f'{"workers":>8} {"logins/s":>9} {"busy":>5} {"reads":>6} {"read p50":>9} {"read p95":>9}')
+        for workers in (int(value) for value in args.workers.split(',')):
+            app = build_app(database, workers, args.method)
+            results = run(app, args.logins, args.seconds)
+            reads = sorted(results['reads']) or [0]
+            p95 = reads[min(int(len(reads) * 0.95), len(reads) - 1)]
+            print(f'{workers:>8} {results["ok"] / args.seconds:>9.1f} {results["busy"]:>5} {len(reads):>6} '
+                  f'{statistics.median(reads):>7.1f}ms {p95:>7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""Check the SQL statement budget of every API route.
+
+Each route in the auth, manga, admin and user blueprints declares its
+budget with @query_budget(n). Every case below runs against a fresh copy
+of a small and of a larger seeded database, with cold in-process caches,
+and counts the statements the request issues. A case fails when it goes
+over the budget or when the larger database needs more statements, which
+is how per-row lazy loads (N+1 queries) show up. The statements of a
+failing case are printed. Exits with status 1 on any failure, or when a
+route has no budget or no case.
+
+    python benchmarks/query_budget.py
+    python benchmarks/query_budget.py --only manga. --verbose
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('APP_ENV', 'testing')
+
+from flask_jwt_extended import create_access_token
+from werkzeug.security import generate_password_hash
+from src.main import create_app, init_database
+from src.models.user import (
+    db, User, Manga, Chapter, Comment, Rating, Review, Favorite, ReadingProgress, Notification, MaintenanceRun
+)
+from src.utils.query_budget import counter, format_statements
+from src.utils.views import views
+
+BLUEPRINTS = ('auth', 'manga', 'admin', 'user')
+
+# Event streams never finish, their budget is not measured per request
+SKIPPED = {'manga.stream_manga_events', 'manga.stream_chapter_events'}
+
+# Fixture sizes: the counts of the two must be the same
+FIXTURES = {
+    'small': {'manga': 3, 'chapters': 2, 'comments': 1, 'authors': 2, 'per_page': 2},
+    'large': {'manga': 12, 'chapters': 6, 'comments': 3, 'authors': 5, 'per_page': 10},
+}
+
+ADMIN_ID, READER_ID, OTHER_ID = 1, 2, 3
+MANGA_ID, CHAPTER_ID = 1, 1  # the first manga and its first chapter
+
+
+def cases(per_page):
+    """(endpoint, method, path, options) for every route; `auth` picks the token"""
+    chapter = f'/api/manga/{MANGA_ID}/chapters/{CHAPTER_ID}'
+    return [
+        ('auth.register', 'POST', '/api/auth/register', {'json': {'username': 'newreader', 'email': 'new@example.com', 'password': 'secret123'}}),
+        ('auth.verify_email', 'POST', '/api/auth/verify', {'json': {'user_id': READER_ID, 'verification_code': '123456'}}),
+        ('auth.login', 'POST', '/api/auth/login', {'json': {'email': 'reader@example.com', 'password': 'secret123'}}),
+        ('auth.get_profile', 'GET', '/api/auth/profile', {'auth': READER_ID}),
+        ('auth.update_profile', 'PUT', '/api/auth/profile', {'auth': READER_ID, 'json': {'bio': 'hello'}}),
+        ('auth.resend_verification', 'POST', '/api/auth/resend-verification', {'json': {'email': 'reader@example.com'}}),
+
+        ('manga.get_manga_list', 'GET', f'/api/manga/?per_page={per_page}', {}),
+        ('manga.get_manga_list', 'GET', f'/api/manga/?per_page={per_page}&sort_by=popular&fields=full', {}),
+        ('manga.get_manga_list', 'GET', f'/api/manga/?per_page={per_page}&genre=action,drama&search_mode=fuzzy&search=manga', {}),
+        ('manga.suggest_manga', 'GET', '/api/manga/suggest?q=man', {}),
+        ('manga.get_facets', 'GET', '/api/manga/facets?genre=action', {}),
+        ('manga.get_latest_updates', 'GET', f'/api/manga/latest-updates?limit={per_page}', {}),
+        ('manga.get_manga_details', 'GET', f'/api/manga/{MANGA_ID}', {'auth': READER_ID}),
+        ('manga.get_manga_chapters', 'GET', f'/api/manga/{MANGA_ID}/chapters?per_page={per_page}', {}),
+        ('manga.get_chapter_details', 'GET', chapter, {'auth': READER_ID}),
+        ('manga.rate_manga', 'POST', f'/api/manga/{MANGA_ID}/rate', {'auth': OTHER_ID, 'json': {'rating': 4}}),
+        ('manga.rate_chapter', 'POST', f'{chapter}/rate', {'auth': OTHER_ID, 'json': {'rating': 4}}),
+        ('manga.add_review', 'POST', f'/api/manga/{MANGA_ID}/review', {'auth': OTHER_ID, 'json': {'content': 'Great series', 'rating': 5}}),
+        ('manga.add_comment', 'POST', f'{chapter}/comments', {'auth': OTHER_ID, 'json': {'content': 'Nice chapter'}}),
+        ('manga.toggle_favorite', 'POST', f'/api/manga/{MANGA_ID}/favorite', {'auth': OTHER_ID}),
+        ('manga.get_user_favorites', 'GET', f'/api/manga/favorites?per_page={per_page}', {'auth': READER_ID}),
+        ('manga.get_reading_progress', 'GET', f'/api/manga/reading-progress?per_page={per_page}', {'auth': READER_ID}),
+        ('manga.sync_user_library', 'GET', '/api/manga/sync', {'auth': READER_ID}),
+
+        ('admin.admin_login', 'POST', '/api/admin/login', {'json': {'password': 'wrong'}, 'status': 401}),
+        ('admin.get_admin_stats', 'GET', '/api/admin/stats', {'auth': ADMIN_ID}),
+        ('admin.create_manga', 'POST', '/api/admin/manga', {'auth': ADMIN_ID, 'json': {'title': 'New', 'arabic_title': 'جديد', 'genre': 'Action, Comedy'}}),
+        ('admin.update_manga', 'PUT', f'/api/admin/manga/{MANGA_ID}', {'auth': ADMIN_ID, 'json': {'genre': 'Action, Romance'}}),
+        ('admin.delete_manga', 'DELETE', f'/api/admin/manga/{MANGA_ID}', {'auth': ADMIN_ID}),
+        ('admin.get_manga_views', 'GET', f'/api/admin/manga/{MANGA_ID}/views', {'auth': ADMIN_ID}),
+        ('admin.get_maintenance_runs', 'GET', f'/api/admin/maintenance?limit={per_page}', {'auth': ADMIN_ID}),
+        ('admin.create_chapter', 'POST', f'/api/admin/manga/{MANGA_ID}/chapters', {'auth': ADMIN_ID, 'json': {'chapter_number': 100, 'images': ['a.jpg']}}),
+        ('admin.update_chapter', 'PUT', f'/api/admin/chapters/{CHAPTER_ID}', {'auth': ADMIN_ID, 'json': {'title': 'Renamed', 'chapter_number': 1.5}}),
+        ('admin.delete_chapter', 'DELETE', f'/api/admin/chapters/{CHAPTER_ID}', {'auth': ADMIN_ID}),
+        ('admin.get_all_comments', 'GET', f'/api/admin/comments?per_page={per_page}', {'auth': ADMIN_ID}),
+        ('admin.pin_comment', 'POST', '/api/admin/comments/1/pin', {'auth': ADMIN_ID}),
+        ('admin.delete_comment', 'DELETE', '/api/admin/comments/1', {'auth': ADMIN_ID}),
+        ('admin.get_all_users', 'GET', f'/api/admin/users?per_page={per_page}', {'auth': ADMIN_ID}),
+        ('admin.ban_user', 'POST', f'/api/admin/users/{OTHER_ID}/ban', {'auth': ADMIN_ID}),
+        ('admin.promote_user', 'POST', f'/api/admin/users/{OTHER_ID}/promote', {'auth': ADMIN_ID}),
+        ('admin.export_data', 'GET', '/api/admin/export/manga', {'auth': ADMIN_ID}),
+        ('admin.import_data', 'POST', '/api/admin/import/manga', {'auth': ADMIN_ID, 'import': True}),
+
+        ('user.get_users', 'GET', '/api/users/users', {}),
+        # Fails on the missing password_hash, still measured so a fix keeps its budget
+        ('user.create_user', 'POST', '/api/users/users', {'json': {'username': 'plain', 'email': 'plain@example.com', 'password': 'secret123'}}),
+        ('user.get_user', 'GET', f'/api/users/users/{READER_ID}', {}),
+        ('user.update_user', 'PUT', f'/api/users/users/{READER_ID}', {'json': {'username': 'renamed'}}),
+        ('user.delete_user', 'DELETE', f'/api/users/users/{READER_ID}', {}),
+    ]
+
+
+def seed(app, manga, chapters, comments, authors, **_):
+    """Fill the database; every manga has the same shape so only sizes differ.
+
+    Comments and reviews rotate over `authors` distinct users, a single
+    author would hide per-row user loads behind the identity map.
+    """
+    from src.utils.tags import set_manga_tags
+    from src.utils import latest_updates
+    from src.utils.trending import ensure_scores
+
+    with app.app_context():
+        users = []
+        author_ids = [OTHER_ID + 1 + number for number in range(authors)]
+        accounts = [(ADMIN_ID, 'admin'), (READER_ID, 'reader'), (OTHER_ID, 'other')]
+        accounts += [(author_id, f'author{author_id}') for author_id in author_ids]
+        for user_id, name in accounts:
+            user = User(id=user_id, username=name, email=f'{name}@example.com', is_admin=user_id == ADMIN_ID)
+            user.set_password('secret123')
+            users.append(user)
+        # An outdated hash, so the login case pays for the upgrade on login
+        users[1].password_hash = generate_password_hash('secret123', method='pbkdf2:sha256:600')
+        db.session.add_all(users)
+        written = 0
+
+        for number in range(manga):
+            entry = Manga(title=f'Manga {number}', arabic_title=f'مانجا {number}',
+                          genre='Action, Drama', description='A story')
+            db.session.add(entry)
+            db.session.flush()
+            set_manga_tags(entry)
+            for chapter_number in range(1, chapters + 1):
+                chapter = Chapter(manga_id=entry.id, chapter_number=chapter_number, images='["1.jpg", "2.jpg"]')
+                db.session.add(chapter)
+                db.session.flush()
+                latest_updates.record_release(chapter)
+                db.session.add(Rating(user_id=READER_ID, chapter_id=chapter.id, rating=4))
+                for _ in range(comments):
+                    author_id = author_ids[written % authors]
+                    written += 1
+                    db.session.add(Comment(user_id=author_id, manga_id=entry.id, chapter_id=chapter.id, content='Comment'))
+                db.session.add(Notification(user_id=READER_ID, manga_id=entry.id, chapter_id=chapter.id, kind='chapter'))
+            db.session.add(Rating(user_id=READER_ID, manga_id=entry.id, rating=5))
+            for author_id in author_ids:
+                db.session.add(Review(user_id=author_id, manga_id=entry.id, content='Review', rating=5))
+            db.session.add(Favorite(user_id=READER_ID, manga_id=entry.id))
+            db.session.add(ReadingProgress(user_id=READER_ID, manga_id=entry.id, last_chapter_read=1))
+            db.session.add(MaintenanceRun(job='storage-gc', duration=0.1, details='{"removed": 0}'))
+        ensure_scores()
+        db.session.commit()
+
+
+def clear_caches():
+    from src.utils import latest_updates
+    from src.utils.fragments import fragments
+    from src.utils.tags import facets
+    from src.utils.suggest import suggest_index
+    from src.utils.fuzzy import fuzzy_index
+
+    fragments.clear()
+    facets.invalidate()
+    suggest_index.invalidate()
+    fuzzy_index.invalidate()
+    latest_updates.first_page.invalidate()
+
+
+def run_case(app, template, database, method, path, options):
+    """Run one request against a fresh copy of the template database"""
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    shutil.copyfile(template, database)
+    clear_caches()
+
+    client = app.test_client()
+    kwargs = {'json': options['json']} if 'json' in options else {}
+    headers = {}
+    if 'auth' in options:
+        with app.app_context():
+            headers['Authorization'] = f'Bearer {create_access_token(identity=str(options["auth"]))}'
+    if options.get('import'):
+        kwargs = {'data': b'{"title": "Imported", "arabic_title": "\\u0645"}\n', 'content_type': 'application/x-ndjson'}
+
+    counter.start()
+    try:
+        response = client.open(path, method=method, headers=headers, **kwargs)
+        response.get_data()  # streamed bodies run their queries while being read
+        status = response.status_code
+    except Exception:
+        status = 500  # the testing profile propagates unhandled errors
+    finally:
+        statements = counter.stop()
+        views.drain()  # counted views would be flushed into the next copy
+    return status, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', default='', help='only run endpoints starting with this')
+    parser.add_argument('--verbose', action='store_true', help='print the statements of every case')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as folder:
+        database = os.path.join(folder, 'budget.db')
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+            'UPLOAD_FOLDER': os.path.join(folder, 'uploads'),
+        })
+        init_database(app)
+        with app.app_context():
+            for engine in db.engines.values():
+                counter.attach(engine)
+
+        counts = {}
+        for name, fixture in FIXTURES.items():
+            template = os.path.join(folder, f'{name}.db')
+            with app.app_context():
+                db.drop_all()
+                db.session.remove()
+            init_database(app)
+            seed(app, **fixture)
+            with app.app_context():
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+            shutil.copyfile(database, template)
+
+            for index, (endpoint, method, path, options) in enumerate(cases(fixture['per_page'])):
+                if not endpoint.startswith(args.only):
+                    continue
+                status, statements = run_case(app, template, database, method, path, options)
+                counts.setdefault((index, endpoint, method, options.get('status')), {})[name] = (path, status, statements)
+
+        budgets = {}
+        for rule in app.url_map.iter_rules():
+            if rule.endpoint.split('.')[0] in BLUEPRINTS and rule.endpoint not in SKIPPED:
+                budgets[rule.endpoint] = getattr(app.view_functions[rule.endpoint], 'query_budget', None)
+
+    covered = {endpoint for _, endpoint, _, _ in counts}
+    for endpoint, budget in sorted(budgets.items()):
+        if not endpoint.startswith(args.only):
+            continue
+        if budget is None:
+            failures.append(f'{endpoint}: no @query_budget declared')
+        if endpoint not in covered:
+            failures.append(f'{endpoint}: no case in benchmarks/query_budget.py')
+
+    print(f'{"endpoint":<32} {"budget":>6} {"small":>6} {"large":>6}  status')
+    for (_, endpoint, method, expected), results in counts.items():
+        budget = budgets.get(endpoint)
+        (path, small_status, small), (_, large_status, large) = results['small'], results['large']
+        print(f'{endpoint:<32} {budget if budget is not None else "-":>6} {len(small):>6} {len(large):>6}  {small_status}/{large_status}')
+
+        problems = []
+        if budget is not None and max(len(small), len(large)) > budget:
+            problems.append(f'over budget ({max(len(small), len(large))} > {budget})')
+        if len(large) > len(small):
+            problems.append(f'count grows with the data ({len(small)} vs {len(large)})')
+        if expected is None and not (small_status < 400 and large_status < 400) or \
+                expected is not None and not small_status == large_status == expected:
+            problems.append(f'unexpected status ({small_status}/{large_status})')
+        if problems or args.verbose:
+            print(f'  {method} {path}')
+            print(format_statements(large))
+            if len(large) > len(small):
+                print('  with the small database:')
+                print(format_statements(small))
+        if problems:
+            failures.append(f'{endpoint} {method} {path}: {", ".join(problems)}')
+
+    if failures:
+        print('\nQuery budget check failed:')
+        print('\n'.join(f'  {failure}' for failure in failures))
+        sys.exit(1)
+    print('\nAll routes are within their query budgets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Measure cold start time of the backend.
+
+Every sample runs in a fresh interpreter and times importing src.main and
+calling create_app(), which is what each worker, test run and CLI command
+pays before doing any work. Exits with status 1 when the median exceeds
+--max-ms so the check can run in CI.
+
+    python benchmarks/startup.py --runs 10 --max-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """
+import json, time
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+src.main.create_app({profile!r})
+created = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'create_ms': (created - imported) * 1000}}))
+"""
+
+
+def run_sample(profile):
+    output = subprocess.run(
+        [sys.executable, '-c', SAMPLE.format(profile=profile)],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--profile', default='testing', help='config profile passed to create_app')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail when the median total exceeds this')
+    args = parser.parse_args()
+
+    run_sample(args.profile)  # warm the bytecode cache
+    samples = [run_sample(args.profile) for _ in range(args.runs)]
+
+    for key in ('import_ms', 'create_ms'):
+        values = [sample[key] for sample in samples]
+        print(f'{key:>10}: median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}')
+    totals = [sample['import_ms'] + sample['create_ms'] for sample in samples]
+    median = statistics.median(totals)
+    print(f'{"total_ms":>10}: median {median:8.1f}')
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f'Startup regression: median {median:.1f}ms is above the {args.max_ms:.1f}ms budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
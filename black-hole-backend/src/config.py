@@ -0,0 +1,150 @@
+import os
+
+BASE_DIR = os.path.dirname(__file__)
+
+
+class Config:
+    """Settings shared by every profile"""
+
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'black-hole-manga-secret-key-2024')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-string-black-hole')
+    JWT_ACCESS_TOKEN_EXPIRES = False
+
+    # Database configuration
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}"
+    )
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Optional read replica, GET requests in the manga API read from it
+    SQLALCHEMY_BINDS = {'replica': os.environ['REPLICA_DATABASE_URL']} if os.environ.get('REPLICA_DATABASE_URL') else {}
+    REPLICA_MAX_LAG = 10  # seconds behind the primary before reads fall back to it
+    REPLICA_LAG_CHECK_INTERVAL = 5  # seconds between replica lag checks
+    REPLICA_HEARTBEAT_INTERVAL = 5  # seconds between heartbeat writes on the primary
+    REPLICA_STICKY_SECONDS = 5  # seconds a client keeps reading from the primary after a write
+
+    # File upload configuration
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+
+    # Largest page size a client may request
+    MAX_PER_PAGE = 100
+
+    # Sub-requests accepted by POST /api/batch
+    BATCH_MAX_REQUESTS = 10
+
+    # Admission control: per process in-flight limits per route class,
+    # see src/utils/admission.py for the defaults of each class
+    ADMISSION_ENABLED = True
+    ADMISSION_SHED_RATIO = 0.75  # share of capacity in use before searches are shed
+
+    # Token bucket rate limits for logins and writes, per endpoint and
+    # per IP / per user, see src/utils/ratelimit.py for the defaults
+    RATELIMIT_ENABLED = True
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))  # reverse proxies in front of the app
+
+    # At most PASSWORD_HASH_WORKERS hashes run at once so login bursts cannot
+    # take every core; hashes with other parameters are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE_TIMEOUT = 5.0  # seconds a login waits for a hashing slot
+
+    # Latest chapters embedded in the manga details response
+    MANGA_DETAILS_CHAPTERS = 20
+
+    # Pages of the current chapter announced with Link: rel=preload
+    CHAPTER_PRELOAD_PAGES = 3
+
+    # Response compression configuration
+    COMPRESS_MIN_SIZE = 1024  # bytes
+    COMPRESS_LEVEL = 6  # gzip 1-9
+    COMPRESS_BR_LEVEL = 5  # brotli 0-11
+
+    # Live events (SSE) configuration
+    EVENTS_HEARTBEAT_INTERVAL = 15  # seconds
+    EVENTS_BUFFER_SIZE = 100  # queued events per connection
+    EVENTS_HISTORY_SIZE = 200  # events kept per topic for resume
+    EVENTS_BRIDGE_DIR = os.environ.get('EVENTS_BRIDGE_DIR')  # set to relay across workers
+
+    # Latest updates feed: first page kept in memory
+    LATEST_UPDATES_BUFFER_SIZE = 20  # entries
+    LATEST_UPDATES_BUFFER_TTL = 30  # seconds before other workers' releases show up
+
+    # Background jobs configuration
+    SCHEDULER_ENABLED = True
+    TRENDING_FLUSH_INTERVAL = 60  # seconds between activity flushes
+    TRENDING_WINDOW_INTERVAL = 600  # seconds between daily/weekly recomputes
+    SIMILAR_REFRESH_INTERVAL = 3600  # seconds between similar manga refreshes, 0 disables
+    VIEWS_FLUSH_INTERVAL = 30  # seconds between view count flushes, the most a crash can lose
+    VIEWS_BUCKET_RETENTION_DAYS = 90  # days of hourly chapter views kept for analytics
+
+    # Database snapshots (flask backup-db / restore-db)
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER', os.path.join(BASE_DIR, 'database', 'backups'))
+    BACKUP_INTERVAL = 86400  # seconds between scheduled snapshots, 0 disables
+    BACKUP_KEEP = 7  # newest snapshots kept
+    BACKUP_METHOD = 'backup'  # 'backup' copies in page steps, 'vacuum' uses VACUUM INTO (best with WAL)
+    BACKUP_PAGES_PER_STEP = 1024  # SQLite pages copied per step
+    BACKUP_STEP_PAUSE = 0.05  # seconds writers get between steps
+
+    # Genre facet counts cache
+    FACETS_CACHE_SIZE = 256  # filter combinations kept
+    FACETS_CACHE_TTL = 300  # seconds before other workers' catalog edits show up
+
+    # Search box suggestions index
+    SUGGEST_INDEX_TTL = 300  # seconds before other workers' catalog edits show up
+
+    # Fuzzy (trigram) title search
+    FUZZY_INDEX_TTL = 300  # seconds before other workers' catalog edits show up
+    FUZZY_MAX_RESULTS = 200  # best matches considered by search_mode=fuzzy
+
+    # Serialized manga kept for list, favorites and details responses
+    FRAGMENT_CACHE_SIZE = 10000  # entries
+
+    # Storage GC and database maintenance, see src/utils/maintenance.py
+    # Off until `flask gc-uploads --dry-run` has been checked against the upload folder
+    STORAGE_GC_INTERVAL = 0  # seconds between scans of the upload folder, 0 disables them
+    STORAGE_GC_GRACE = 86400  # seconds an unreferenced upload is kept before it is removed
+    DB_MAINTENANCE_INTERVAL = 86400  # seconds between ANALYZE and incremental vacuum runs
+
+    # Notifications configuration
+    NOTIFICATIONS_SYNC = False  # True runs the new chapter fan-out inside the request
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    QUERY_BUDGET_WARN = True  # log routes going over their @query_budget
+
+
+class ProductionConfig(Config):
+    pass
+
+
+class TestingConfig(Config):
+    TESTING = True
+    ADMISSION_ENABLED = False
+    RATELIMIT_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast hashes, tests are not about KDF cost
+    PASSWORD_HASH_WORKERS = 0
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SCHEDULER_ENABLED = False
+    SIMILAR_REFRESH_INTERVAL = 0
+    BACKUP_INTERVAL = 0
+    STORAGE_GC_INTERVAL = 0
+    DB_MAINTENANCE_INTERVAL = 0
+    NOTIFICATIONS_SYNC = True
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    """Return the config class for `name`, or for the APP_ENV environment variable"""
+    name = name or os.environ.get('APP_ENV', 'development')
+    try:
+        return config_by_name[name]
+    except KeyError:
+        raise ValueError(f'Unknown config profile: {name}')
@@ -4,71 +4,138 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
-from flask_cors import CORS
-from flask_mail import Mail
-from flask_jwt_extended import JWTManager
+from src.config import get_config
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.manga import manga_bp
-from src.routes.admin import admin_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = 'black-hole-manga-secret-key-2024'
-app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-black-hole'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
-
-# Mail configuration'
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# File upload configuration
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Initialize extensions
-CORS(app, origins="*")
-mail = Mail(app)
-jwt = JWTManager(app)
-db.init_app(app)
-
-# Create upload directories
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'profiles'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'manga'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'chapters'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'comments'), exist_ok=True)
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(user_bp, url_prefix='/api/users')
-app.register_blueprint(manga_bp, url_prefix='/api/manga')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-
-# Create database tables
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
+
+UPLOAD_SUBFOLDERS = ('profiles', 'manga', 'chapters', 'comments')
+
+
+def create_app(config=None):
+    """Build and configure the application.
+
+    `config` is a profile name ('development', 'production', 'testing'), a
+    config class, or a dict of overrides applied on top of the APP_ENV
+    profile. Nothing touches the database or the filesystem here; run
+    `flask init-db` to create the schema and upload folders.
+    """
+    # Blueprints and subsystems are imported here so importing this module stays cheap
+    from flask_cors import CORS
+    from flask_mail import Mail
+    from flask_jwt_extended import JWTManager
+    from src.routes.user import user_bp
+    from src.routes.auth import auth_bp
+    from src.routes.manga import manga_bp
+    from src.routes.admin import admin_bp
+    from src.routes.notifications import notifications_bp
+    from src.routes.batch import batch_bp
+    from src.utils.admission import init_admission
+    from src.utils.ratelimit import init_ratelimit
+    from src.utils.passwords import init_passwords
+    from src.utils.compression import init_compression
+    from src.utils.events import init_events
+    from src.utils.latest_updates import init_latest_updates
+    from src.utils.scheduler import init_scheduler
+    from src.utils.trending import init_trending
+    from src.utils.views import init_views
+    from src.utils.sync import init_sync
+    from src.utils.recommendations import init_recommendations
+    from src.utils.tags import init_tags
+    from src.utils.suggest import init_suggest
+    from src.utils.fuzzy import init_fuzzy
+    from src.utils.fragments import init_fragments
+    from src.utils.replica import init_replica
+    from src.utils.backup import init_backup
+    from src.utils.query_budget import init_query_budget
+    from src.utils.maintenance import init_maintenance
+
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    if config is None or isinstance(config, (str, dict)):
+        app.config.from_object(get_config(config if isinstance(config, str) else None))
+        if isinstance(config, dict):
+            app.config.update(config)
     else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+        app.config.from_object(config)
+
+    # Initialize extensions
+    CORS(app, origins="*")
+    Mail(app)
+    JWTManager(app)
+    db.init_app(app)
+    init_admission(app)
+    init_ratelimit(app)
+    init_passwords(app)
+    init_compression(app)
+    init_events(app)
+    init_latest_updates(app)
+    init_trending(app)
+    init_views(app)
+    init_sync(app)
+    init_recommendations(app)
+    init_tags(app)
+    init_suggest(app)
+    init_fuzzy(app)
+    init_fragments(app)
+    init_replica(app)
+    init_backup(app)
+    init_query_budget(app)
+    init_maintenance(app)
+    init_scheduler(app)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(user_bp, url_prefix='/api/users')
+    app.register_blueprint(manga_bp, url_prefix='/api/manga')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create or upgrade the schema and the upload folders."""
+        init_database(app)
+        print('Database and upload folders are up to date')
+
+    return app
+
+
+def init_database(app):
+    """Create database tables, apply additive schema changes and create upload folders"""
+    from src.models.schema import upgrade_schema
+    from src.utils.tags import migrate_genres
+    from src.utils.trending import ensure_scores
+    from src.utils.latest_updates import ensure_feed
+    from src.utils.maintenance import set_incremental_vacuum
+
+    for folder in UPLOAD_SUBFOLDERS:
+        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], folder), exist_ok=True)
+
+    with app.app_context():
+        set_incremental_vacuum()  # only takes effect on a new SQLite file
+        upgrade_schema()
+        migrate_genres()  # tags manga created before the tag table existed
+        ensure_scores()  # score rows for manga created before they were required
+        db.session.commit()
+        ensure_feed()  # latest updates of chapters released before the feed table existed
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app = create_app()
+    init_database(app)
+    app.run(host='0.0.0.0', port=5000, debug=app.config.get('DEBUG', False))
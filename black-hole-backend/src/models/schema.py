@@ -0,0 +1,33 @@
+from sqlalchemy import inspect
+from src.models.user import db
+
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models.
+
+    `db.create_all()` only creates missing tables. This also adds columns
+    and indexes that were introduced after a table was first created.
+    Every step is idempotent, so it is safe to run on each start.
+    """
+    db.create_all()
+
+    engine = db.engine
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = ''
+                if column.server_default is not None:
+                    default = f' DEFAULT {column.server_default.arg}'
+                connection.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}{default}'
+                )
+
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
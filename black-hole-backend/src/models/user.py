@@ -1,10 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.utils.replica import RoutingSession
+from src.utils.passwords import hasher
 from datetime import datetime
 import random
+import json
 import string
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -27,12 +29,18 @@ class User(db.Model):
     reviews = db.relationship('Review', backref='user', lazy=True, cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='user', lazy=True, cascade='all, delete-orphan')
     reading_progress = db.relationship('ReadingProgress', backref='user', lazy=True, cascade='all, delete-orphan')
+    sync_tombstones = db.relationship('SyncTombstone', backref='user', lazy=True, cascade='all, delete-orphan')
+    notifications = db.relationship('Notification', backref='user', lazy=True, cascade='all, delete-orphan')
+    notification_counter = db.relationship('NotificationCounter', uselist=False, lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
 
     def generate_verification_code(self):
         self.verification_code = ''.join(random.choices(string.digits, k=6))
@@ -56,6 +64,26 @@ class User(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Association between manga and their normalized genre tags
+manga_tag = db.Table(
+    'manga_tag',
+    db.Column('manga_id', db.Integer, db.ForeignKey('manga.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_manga_tag_tag', 'tag_id', 'manga_id')
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    slug = db.Column(db.String(50), unique=True, nullable=False)  # lowercased name used for lookups
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'slug': self.slug
+        }
+
 class Manga(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -66,6 +94,8 @@ class Manga(db.Model):
     status = db.Column(db.String(50), default='ongoing')  # ongoing, completed, hiatus
     author = db.Column(db.String(100))
     artist = db.Column(db.String(100))
+    version = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # bumped when ratings or chapters change
+    views = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # manga page and chapter views, see utils/views.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -76,6 +106,10 @@ class Manga(db.Model):
     reviews = db.relationship('Review', backref='manga', lazy=True, cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='manga', lazy=True, cascade='all, delete-orphan')
     reading_progress = db.relationship('ReadingProgress', backref='manga', lazy=True, cascade='all, delete-orphan')
+    latest_update = db.relationship('LatestUpdate', uselist=False, lazy=True, cascade='all, delete-orphan')
+    score = db.relationship('MangaScore', uselist=False, lazy=True, cascade='all, delete-orphan')
+    similar = db.relationship('SimilarManga', foreign_keys='SimilarManga.manga_id', lazy=True, cascade='all, delete-orphan')
+    tags = db.relationship('Tag', secondary=manga_tag, lazy=True)
 
     @property
     def average_rating(self):
@@ -100,6 +134,7 @@ class Manga(db.Model):
             'artist': self.artist,
             'average_rating': self.average_rating,
             'total_chapters': self.total_chapters,
+            'views': self.views,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -110,12 +145,18 @@ class Chapter(db.Model):
     chapter_number = db.Column(db.Float, nullable=False)
     title = db.Column(db.String(200))
     images = db.Column(db.Text)  # JSON string of image URLs
+    views = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     comments = db.relationship('Comment', backref='chapter', lazy=True, cascade='all, delete-orphan')
     ratings = db.relationship('Rating', backref='chapter', lazy=True, cascade='all, delete-orphan')
+    view_buckets = db.relationship('ChapterViewBucket', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_chapter_manga_number', 'manga_id', 'chapter_number'),
+    )
 
     @property
     def average_rating(self):
@@ -123,14 +164,16 @@ class Chapter(db.Model):
             return sum(r.rating for r in self.ratings) / len(self.ratings)
         return 0
 
-    def to_dict(self):
+    def to_dict(self, average_rating=None):
+        # average_rating can be passed when it was selected with the row
         return {
             'id': self.id,
             'manga_id': self.manga_id,
             'chapter_number': self.chapter_number,
             'title': self.title,
             'images': self.images,
-            'average_rating': self.average_rating,
+            'average_rating': self.average_rating if average_rating is None else average_rating,
+            'views': self.views,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -146,6 +189,10 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_comment_chapter', 'chapter_id', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -172,6 +219,9 @@ class Rating(db.Model):
     __table_args__ = (
         db.UniqueConstraint('user_id', 'manga_id', name='unique_user_manga_rating'),
         db.UniqueConstraint('user_id', 'chapter_id', name='unique_user_chapter_rating'),
+        db.Index('ix_rating_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_rating_manga', 'manga_id'),
+        db.Index('ix_rating_chapter', 'chapter_id'),
     )
 
     def to_dict(self):
@@ -217,6 +267,8 @@ class Favorite(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'manga_id', name='unique_user_manga_favorite'),
+        db.Index('ix_favorite_user_created', 'user_id', 'created_at'),
+        db.Index('ix_favorite_manga', 'manga_id', 'id'),
     )
 
     def to_dict(self):
@@ -237,6 +289,7 @@ class ReadingProgress(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'manga_id', name='unique_user_manga_progress'),
+        db.Index('ix_reading_progress_user_updated', 'user_id', 'updated_at'),
     )
 
     def to_dict(self):
@@ -248,3 +301,125 @@ class ReadingProgress(db.Model):
             'last_chapter_read': self.last_chapter_read,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+class SyncTombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # favorite, reading_progress, rating
+    entity_id = db.Column(db.Integer, nullable=False)
+    manga_id = db.Column(db.Integer)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_sync_tombstone_user_deleted', 'user_id', 'deleted_at'),
+        db.Index('ix_sync_tombstone_deleted', 'deleted_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'id': self.entity_id,
+            'manga_id': self.manga_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+class Notification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'))
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'))
+    kind = db.Column(db.String(20), default='chapter')  # chapter
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_notification_user_id', 'user_id', 'id'),
+    )
+
+class NotificationCounter(db.Model):
+    # One row per user so the unread badge is a primary key lookup
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, default=0, nullable=False)
+
+class LatestUpdate(db.Model):
+    # One row per manga, rewritten whenever a chapter is released
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'), primary_key=True)
+    released_at = db.Column(db.DateTime, nullable=False)
+    recent_chapters = db.Column(db.Text)  # JSON list of the latest chapters, newest first
+
+    __table_args__ = (
+        db.Index('ix_latest_update_released', 'released_at', 'manga_id'),
+    )
+
+class ActivityBucket(db.Model):
+    # Weighted reader activity per manga and hour, feeds the popularity scores
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    reads = db.Column(db.Integer, default=0, nullable=False)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+    ratings = db.Column(db.Integer, default=0, nullable=False)
+    score = db.Column(db.Float, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_activity_bucket_hour', 'hour'),
+    )
+
+class ChapterViewBucket(db.Model):
+    # Chapter views per hour for analytics, manga level views are in ActivityBucket
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'), nullable=False)
+    views = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_chapter_view_bucket_manga', 'manga_id', 'hour'),
+        db.Index('ix_chapter_view_bucket_hour', 'hour'),
+    )
+
+class MangaScore(db.Model):
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'), primary_key=True)
+    trending = db.Column(db.Float, default=0, nullable=False)  # exponentially decayed activity
+    popular_daily = db.Column(db.Float, default=0, nullable=False)
+    popular_weekly = db.Column(db.Float, default=0, nullable=False)
+    popular_all = db.Column(db.Float, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # manga_id breaks ties, so ranked pages are read in index order without a sort
+        db.Index('ix_manga_score_trending_id', 'trending', 'manga_id'),
+        db.Index('ix_manga_score_daily_id', 'popular_daily', 'manga_id'),
+        db.Index('ix_manga_score_weekly_id', 'popular_weekly', 'manga_id'),
+        db.Index('ix_manga_score_all_id', 'popular_all', 'manga_id'),
+    )
+
+class JobState(db.Model):
+    # Last run of a periodic job, shared by every worker process
+    name = db.Column(db.String(50), primary_key=True)
+    last_run_at = db.Column(db.DateTime, nullable=False)
+
+class MaintenanceRun(db.Model):
+    # Report of one storage or database maintenance run
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    duration = db.Column(db.Float, nullable=False)  # seconds
+    bytes_reclaimed = db.Column(db.BigInteger, default=0, nullable=False)
+    details = db.Column(db.Text)  # JSON report of the run
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job': self.job,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.duration,
+            'bytes_reclaimed': self.bytes_reclaimed,
+            'details': json.loads(self.details) if self.details else None
+        }
+
+class SimilarManga(db.Model):
+    # Precomputed "readers also liked" neighbors, rank 0 is the closest
+    manga_id = db.Column(db.Integer, db.ForeignKey('manga.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_id = db.Column(db.Integer, db.ForeignKey('manga.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
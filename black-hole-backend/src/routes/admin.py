@@ -1,6 +1,26 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User, Manga, Chapter, Comment, Rating, Review
+from src.models.user import db, User, Manga, Chapter, Comment, Rating, Review, Notification, ChapterViewBucket, MangaScore
+from src.utils.events import broker
+from src.utils import latest_updates
+from src.utils.trending import remove_manga as remove_manga_activity, ensure_scores
+from src.utils.notifications import schedule_new_chapter_notifications, remove_notifications
+from src.utils.sync import record_manga_removals, record_chapter_removals
+from src.utils.tags import set_manga_tags, migrate_genres, facets
+from src.utils.suggest import suggest_index
+from src.utils.fuzzy import fuzzy_index
+from src.utils.fragments import bump_manga_versions
+from src.utils.export import EXPORT_MODELS, generate_ndjson, generate_csv, read_ndjson, read_csv, load_rows
+from src.utils.pagination import pagination_args
+from src.utils.admission import admission
+from src.utils.passwords import hasher
+from src.utils.views import hourly_views, chapter_views
+from src.utils.ratelimit import rate_limit
+from src.utils.maintenance import recent_runs
+from src.utils.query_budget import query_budget
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+import io
 import json
 import os
 from werkzeug.utils import secure_filename
@@ -24,6 +44,8 @@ def check_admin_password(password):
     return password == ADMIN_PASSWORD
 
 @admin_bp.route('/login', methods=['POST'])
+@query_budget(1)
+@rate_limit('admin_login')
 def admin_login():
     try:
         data = request.get_json()
@@ -42,6 +64,7 @@ def admin_login():
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/stats', methods=['GET'])
+@query_budget(12)
 @jwt_required()
 def get_admin_stats():
     try:
@@ -60,7 +83,9 @@ def get_admin_stats():
         
         # Recent activity
         recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-        recent_comments = Comment.query.order_by(Comment.created_at.desc()).limit(10).all()
+        recent_comments = Comment.query.options(selectinload(Comment.user)).order_by(
+            Comment.created_at.desc()
+        ).limit(10).all()
         
         stats = {
             'totals': {
@@ -76,7 +101,9 @@ def get_admin_stats():
             'recent_activity': {
                 'users': [user.to_dict() for user in recent_users],
                 'comments': [comment.to_dict() for comment in recent_comments]
-            }
+            },
+            'admission': admission.stats(),
+            'password_hashing': hasher.stats()
         }
         
         return jsonify({'stats': stats}), 200
@@ -84,7 +111,24 @@ def get_admin_stats():
     except Exception as e:
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@admin_bp.route('/maintenance', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_maintenance_runs():
+    try:
+        if not check_admin_access():
+            return jsonify({'error': 'غير مصرح لك بالوصول'}), 403
+        
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        runs = recent_runs(limit, request.args.get('job'))
+        
+        return jsonify({'runs': [run.to_dict() for run in runs]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
 @admin_bp.route('/manga', methods=['POST'])
+@query_budget(10)
 @jwt_required()
 def create_manga():
     try:
@@ -126,9 +170,14 @@ def create_manga():
             artist=artist,
             cover_image=cover_image
         )
+        set_manga_tags(new_manga)
+        new_manga.score = MangaScore()  # ranked lists only list manga with a score row
         
         db.session.add(new_manga)
         db.session.commit()
+        facets.invalidate()
+        suggest_index.upsert(new_manga)
+        fuzzy_index.upsert(new_manga)
         
         return jsonify({
             'message': 'تم إنشاء المانجا بنجاح',
@@ -140,6 +189,7 @@ def create_manga():
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/manga/<int:manga_id>', methods=['PUT'])
+@query_budget(11)
 @jwt_required()
 def update_manga(manga_id):
     try:
@@ -164,6 +214,7 @@ def update_manga(manga_id):
             manga.description = data['description'].strip()
         if 'genre' in data:
             manga.genre = data['genre'].strip()
+            set_manga_tags(manga)
         if 'status' in data:
             manga.status = data['status']
         if 'author' in data:
@@ -174,6 +225,10 @@ def update_manga(manga_id):
             manga.cover_image = data['cover_image']
         
         db.session.commit()
+        latest_updates.first_page.invalidate()
+        facets.invalidate()
+        suggest_index.upsert(manga)
+        fuzzy_index.upsert(manga)
         
         return jsonify({
             'message': 'تم تحديث المانجا بنجاح',
@@ -185,6 +240,7 @@ def update_manga(manga_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/manga/<int:manga_id>', methods=['DELETE'])
+@query_budget(30)
 @jwt_required()
 def delete_manga(manga_id):
     try:
@@ -195,8 +251,26 @@ def delete_manga(manga_id):
         if not manga:
             return jsonify({'error': 'المانجا غير موجودة'}), 404
         
+        record_manga_removals(manga_id)
+        remove_notifications(Notification.manga_id == manga_id)
+        remove_manga_activity(manga_id)
+        # Chapters and their rows go in bulk, the cascade loads them chapter by chapter
+        chapter_ids = db.select(Chapter.id).where(Chapter.manga_id == manga_id)
+        for model in (Comment, Rating, ChapterViewBucket):
+            db.session.execute(
+                db.delete(model).where(model.chapter_id.in_(chapter_ids)),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.execute(
+            db.delete(Chapter).where(Chapter.manga_id == manga_id),
+            execution_options={'synchronize_session': False}
+        )
         db.session.delete(manga)
         db.session.commit()
+        latest_updates.first_page.invalidate()
+        facets.invalidate()
+        suggest_index.remove(manga_id)
+        fuzzy_index.remove(manga_id)
         
         return jsonify({'message': 'تم حذف المانجا بنجاح'}), 200
         
@@ -204,7 +278,32 @@ def delete_manga(manga_id):
         db.session.rollback()
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@admin_bp.route('/manga/<int:manga_id>/views', methods=['GET'])
+@query_budget(4)
+@jwt_required()
+def get_manga_views(manga_id):
+    try:
+        if not check_admin_access():
+            return jsonify({'error': 'غير مصرح لك بالوصول'}), 403
+        
+        manga = db.session.get(Manga, manga_id)
+        if not manga:
+            return jsonify({'error': 'المانجا غير موجودة'}), 404
+        
+        hours = min(max(request.args.get('hours', 48, type=int), 1), 24 * 90)
+        
+        return jsonify({
+            'manga_id': manga_id,
+            'views': manga.views,
+            'hourly': hourly_views(manga_id, hours),
+            'chapters': chapter_views(manga_id, hours)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
 @admin_bp.route('/manga/<int:manga_id>/chapters', methods=['POST'])
+@query_budget(14)
 @jwt_required()
 def create_chapter(manga_id):
     try:
@@ -243,11 +342,19 @@ def create_chapter(manga_id):
         )
         
         db.session.add(new_chapter)
+        db.session.flush()
+        latest_updates.record_release(new_chapter)
+        bump_manga_versions(Manga.id == new_chapter.manga_id)
         db.session.commit()
         
+        latest_updates.publish_release(manga_id)
+        chapter_data = new_chapter.to_dict()
+        broker.publish(f'manga:{manga_id}', 'chapter', chapter_data)
+        schedule_new_chapter_notifications(new_chapter.id)
+        
         return jsonify({
             'message': 'تم إنشاء الفصل بنجاح',
-            'chapter': new_chapter.to_dict()
+            'chapter': chapter_data
         }), 201
         
     except Exception as e:
@@ -255,6 +362,7 @@ def create_chapter(manga_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/chapters/<int:chapter_id>', methods=['PUT'])
+@query_budget(8)
 @jwt_required()
 def update_chapter(chapter_id):
     try:
@@ -278,7 +386,14 @@ def update_chapter(chapter_id):
         if 'images' in data:
             chapter.images = json.dumps(data['images'])
         
+        # The feed row lists chapter numbers, it is rebuilt from the edited chapters
+        renumbered = 'chapter_number' in data
+        if renumbered:
+            latest_updates.refresh_manga(chapter.manga_id)
+        
         db.session.commit()
+        if renumbered:
+            latest_updates.first_page.invalidate()
         
         return jsonify({
             'message': 'تم تحديث الفصل بنجاح',
@@ -290,6 +405,7 @@ def update_chapter(chapter_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/chapters/<int:chapter_id>', methods=['DELETE'])
+@query_budget(15)
 @jwt_required()
 def delete_chapter(chapter_id):
     try:
@@ -300,8 +416,13 @@ def delete_chapter(chapter_id):
         if not chapter:
             return jsonify({'error': 'الفصل غير موجود'}), 404
         
+        record_chapter_removals(chapter)
+        remove_notifications(Notification.chapter_id == chapter_id)
+        latest_updates.refresh_manga(chapter.manga_id, exclude_chapter_id=chapter_id)
+        bump_manga_versions(Manga.id == chapter.manga_id)
         db.session.delete(chapter)
         db.session.commit()
+        latest_updates.first_page.invalidate()
         
         return jsonify({'message': 'تم حذف الفصل بنجاح'}), 200
         
@@ -310,16 +431,16 @@ def delete_chapter(chapter_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/comments', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 def get_all_comments():
     try:
         if not check_admin_access():
             return jsonify({'error': 'غير مصرح لك بالوصول'}), 403
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page, per_page = pagination_args(20)
         
-        pagination = Comment.query.order_by(Comment.created_at.desc()).paginate(
+        pagination = Comment.query.options(selectinload(Comment.user)).order_by(Comment.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -341,6 +462,7 @@ def get_all_comments():
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/comments/<int:comment_id>/pin', methods=['POST'])
+@query_budget(5)
 @jwt_required()
 def pin_comment(comment_id):
     try:
@@ -366,6 +488,7 @@ def pin_comment(comment_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/comments/<int:comment_id>', methods=['DELETE'])
+@query_budget(3)
 @jwt_required()
 def delete_comment(comment_id):
     try:
@@ -386,14 +509,14 @@ def delete_comment(comment_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/users', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_all_users():
     try:
         if not check_admin_access():
             return jsonify({'error': 'غير مصرح لك بالوصول'}), 403
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page, per_page = pagination_args(20)
         
         pagination = User.query.order_by(User.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
@@ -417,6 +540,7 @@ def get_all_users():
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/users/<int:user_id>/ban', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def ban_user(user_id):
     try:
@@ -445,6 +569,7 @@ def ban_user(user_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @admin_bp.route('/users/<int:user_id>/promote', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def promote_user(user_id):
     try:
@@ -472,3 +597,95 @@ def promote_user(user_id):
         db.session.rollback()
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@admin_bp.route('/export/<entity>', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def export_data(entity):
+    try:
+        if not check_admin_access():
+            return jsonify({'error': 'غير مصرح لك بالوصول'}), 403
+        
+        model = EXPORT_MODELS.get(entity)
+        if not model:
+            return jsonify({'error': 'نوع البيانات غير مدعوم'}), 404
+        
+        # User dumps contain password hashes, only full admins may take them
+        if model is User:
+            current_user = User.query.get(get_jwt_identity())
+            if not current_user.is_admin:
+                return jsonify({'error': 'فقط المسؤول يمكنه تصدير المستخدمين'}), 403
+        
+        export_format = request.args.get('format', 'ndjson')
+        
+        if export_format == 'csv':
+            body = generate_csv(model)
+            mimetype = 'text/csv'
+        elif export_format == 'ndjson':
+            body = generate_ndjson(model)
+            mimetype = 'application/x-ndjson'
+        else:
+            return jsonify({'error': 'صيغة التصدير غير مدعومة'}), 400
+        
+        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        filename = f'{entity}-{timestamp}.{export_format}'
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@admin_bp.route('/import/<entity>', methods=['POST'])
+@query_budget(4)
+@jwt_required()
+def import_data(entity):
+    try:
+        current_user = User.query.get(get_jwt_identity())
+        if not current_user or not current_user.is_admin:
+            return jsonify({'error': 'فقط المسؤول يمكنه استيراد البيانات'}), 403
+        
+        model = EXPORT_MODELS.get(entity)
+        if not model:
+            return jsonify({'error': 'نوع البيانات غير مدعوم'}), 404
+        
+        import_format = request.args.get('format', 'ndjson')
+        
+        # Read the body line by line instead of buffering it
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        
+        if import_format == 'csv':
+            records = read_csv(stream)
+        elif import_format == 'ndjson':
+            records = read_ndjson(stream)
+        else:
+            return jsonify({'error': 'صيغة الاستيراد غير مدعومة'}), 400
+        
+        imported = load_rows(model, records)
+        if model in (Chapter, Rating):
+            # Imported rows change chapter counts and average ratings
+            bump_manga_versions(db.true())
+        if model is Manga:
+            ensure_scores()
+        db.session.commit()
+        if model is Manga:
+            migrate_genres()
+            suggest_index.invalidate()
+            fuzzy_index.invalidate()
+        
+        return jsonify({
+            'message': 'تم استيراد البيانات بنجاح',
+            'imported': imported
+        }), 200
+        
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'بعض السجلات موجودة بالفعل أو غير صالحة'}), 409
+    except (ValueError, KeyError):
+        db.session.rollback()
+        return jsonify({'error': 'ملف الاستيراد غير صالح'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from flask_mail import Message, Mail
 from src.models.user import db, User
+from src.utils.ratelimit import rate_limit, json_field
+from src.utils.passwords import PasswordHashBusy
+from src.utils.query_budget import query_budget
 import re
 
 auth_bp = Blueprint("auth", __name__)
@@ -13,7 +16,15 @@ def is_valid_email(email):
 def is_valid_password(password):
     return len(password) >= 6
 
+def hashing_busy():
+    response = jsonify({"error": "الخادم مشغول حالياً، يرجى المحاولة لاحقاً"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "2"
+    return response
+
 @auth_bp.route("/register", methods=["POST"])
+@query_budget(4)
+@rate_limit('register')
 def register():
     try:
         data = request.get_json()
@@ -55,11 +66,16 @@ def register():
             "user_id": user.id
         }), 201
         
+    except PasswordHashBusy:
+        db.session.rollback()
+        return hashing_busy()
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "حدث خطأ في الخادم"}), 500
 
 @auth_bp.route("/verify", methods=["POST"])
+@query_budget(1)
+@rate_limit('verify', user_key=json_field('user_id'))
 def verify_email():
     try:
         data = request.get_json()
@@ -95,6 +111,8 @@ def verify_email():
         return jsonify({"error": "حدث خطأ في الخادم"}), 500
 
 @auth_bp.route("/login", methods=["POST"])
+@query_budget(2)
+@rate_limit('login', user_key=json_field('email'))
 def login():
     try:
         data = request.get_json()
@@ -121,17 +139,28 @@ def login():
         
         # Create access token
         access_token = create_access_token(identity=user.id)
+        user_data = user.to_dict()
+        
+        # Upgrade hashes made with older KDF parameters while the password is
+        # at hand, after to_dict so the commit does not reload the user
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
         
         return jsonify({
             "message": "تم تسجيل الدخول بنجاح",
             "access_token": access_token,
-            "user": user.to_dict()
+            "user": user_data
         }), 200
         
+    except PasswordHashBusy:
+        db.session.rollback()
+        return hashing_busy()
     except Exception as e:
         return jsonify({"error": "حدث خطأ في الخادم"}), 500
 
 @auth_bp.route("/profile", methods=["GET"])
+@query_budget(1)
 @jwt_required()
 def get_profile():
     try:
@@ -147,6 +176,7 @@ def get_profile():
         return jsonify({"error": "حدث خطأ في الخادم"}), 500
 
 @auth_bp.route("/profile", methods=["PUT"])
+@query_budget(3)
 @jwt_required()
 def update_profile():
     try:
@@ -187,6 +217,8 @@ def update_profile():
         return jsonify({"error": "حدث خطأ في الخادم"}), 500
 
 @auth_bp.route("/resend-verification", methods=["POST"])
+@query_budget(1)
+@rate_limit('resend_verification', user_key=json_field('email'))
 def resend_verification():
     try:
         data = request.get_json()
@@ -0,0 +1,149 @@
+from urllib.parse import urlsplit
+from flask import Blueprint, request, jsonify, current_app, g
+from werkzeug.routing import RequestRedirect
+from werkzeug.test import EnvironBuilder
+from src.models.user import db
+from src.utils.admission import admission, classify_request
+
+batch_bp = Blueprint('batch', __name__)
+
+# Only read routes of these APIs can be batched
+BATCH_PREFIXES = ('/api/manga', '/api/auth')
+
+# Event streams never finish, they cannot be part of a batch
+STREAM_ENDPOINTS = {'manga.stream_manga_events', 'manga.stream_chapter_events'}
+
+
+def parse_item(item):
+    """Return (id, path, query string) of a sub-request or raise ValueError"""
+    if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+        raise ValueError('path')
+    if str(item.get('method', 'GET')).upper() != 'GET':
+        raise ValueError('method')
+
+    parts = urlsplit(item['path'])
+    path = parts.path
+    if parts.scheme or parts.netloc or '..' in path or not any(
+        path == prefix or path.startswith(prefix + '/') for prefix in BATCH_PREFIXES
+    ):
+        raise ValueError('path')
+
+    params = item.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValueError('params')
+    query_string = '&'.join(filter(None, [parts.query, EnvironBuilder(query_string=params).query_string]))
+    return item.get('id'), path, query_string
+
+
+def preprocess_blueprints():
+    """Run the before_request hooks of the sub-request's blueprints"""
+    for name in request.blueprints:
+        for func in current_app.before_request_funcs.get(name, ()):
+            rv = current_app.ensure_sync(func)()
+            if rv is not None:
+                return rv
+    return None
+
+
+def admit_item():
+    """Take an admission slot for the sub-request's route class.
+
+    Returns the class to release, None when admission does not apply and
+    False when the item is shed. The batch itself is exempt, so a batch
+    of searches is charged like the same searches sent one by one.
+    """
+    if not current_app.config.get('ADMISSION_ENABLED'):
+        return None
+    route_class = classify_request()
+    if route_class is None:
+        return None
+    return route_class if admission.admit(route_class) else False
+
+
+def run_sub_request(path, query_string, follow_redirect=True):
+    """Dispatch one GET inside the current app context.
+
+    The sub-request shares g, the JWT and the database session of the batch
+    request. Blueprint hooks and admission run per item, the other app wide
+    hooks (compression) only apply to the batch request itself.
+    """
+    headers = {name: value for name, value in request.headers.items() if name in ('Authorization', 'Cookie', 'Accept-Language')}
+    environ = EnvironBuilder(
+        path=path, query_string=query_string, method='GET', headers=headers,
+        environ_base={'REMOTE_ADDR': request.remote_addr}
+    ).get_environ()
+
+    read_replica = g.get('read_replica')
+    with current_app.request_context(environ):
+        # e.g. /api/manga -> /api/manga/, followed once
+        if isinstance(request.routing_exception, RequestRedirect) and follow_redirect:
+            redirect_path = urlsplit(request.routing_exception.new_url).path
+        else:
+            redirect_path = None
+        route_class = None
+        try:
+            if redirect_path is not None:
+                rv = None
+            elif request.routing_exception is not None:
+                raise request.routing_exception
+            elif request.endpoint in STREAM_ENDPOINTS:
+                return 400, {'error': 'لا يمكن تضمين هذا المسار في الدفعة'}
+            else:
+                route_class = admit_item()
+                if route_class is False:
+                    return 503, {'error': 'الخادم مشغول حالياً، يرجى المحاولة لاحقاً'}
+                rv = preprocess_blueprints()
+                if rv is None:
+                    view = current_app.view_functions[request.endpoint]
+                    rv = current_app.ensure_sync(view)(**request.view_args)
+        except Exception as e:
+            # The next items share the session, a failed statement must not poison it
+            db.session.rollback()
+            # Handlers registered by extensions, e.g. JWT errors
+            try:
+                rv = current_app.handle_user_exception(e)
+            except Exception:
+                return 500, {'error': 'حدث خطأ في الخادم'}
+        finally:
+            g.read_replica = read_replica
+            if route_class:
+                admission.release(route_class)
+
+        if redirect_path is None:
+            response = current_app.make_response(rv)
+            if response.status_code >= 500:
+                db.session.rollback()  # views answer their own errors with a 500
+            return response.status_code, response.get_json(silent=True)
+
+    return run_sub_request(redirect_path, query_string, follow_redirect=False)
+
+
+@batch_bp.route('/', methods=['POST'], strict_slashes=False)
+def run_batch():
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('requests') if isinstance(data, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'قائمة الطلبات مطلوبة'}), 400
+        
+        max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 10)
+        if len(items) > max_requests:
+            return jsonify({'error': f'الحد الأقصى للطلبات في الدفعة هو {max_requests}'}), 400
+        
+        responses = []
+        for index, item in enumerate(items):
+            try:
+                item_id, path, query_string = parse_item(item)
+            except ValueError:
+                item_id = item.get('id', index) if isinstance(item, dict) else index
+                responses.append({'id': item_id, 'status': 400, 'body': {'error': 'الطلب غير صالح للدفعة'}})
+                continue
+        
+            status, body = run_sub_request(path, query_string)
+            responses.append({'id': index if item_id is None else item_id, 'status': status, 'body': body})
+        
+        return jsonify({'responses': responses}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
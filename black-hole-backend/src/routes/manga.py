@@ -1,59 +1,160 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from src.models.user import db, User, Manga, Chapter, Comment, Rating, Review, Favorite, ReadingProgress
+from src.models.user import db, User, Manga, Chapter, Comment, Rating, Review, Favorite, ReadingProgress, MangaScore
+from src.utils.fields import parse_fields, chapter_columns, chapter_average_rating, row_to_dict, CHAPTER_LIST_FIELDS
+from src.utils.sync import decode_token, collect_changes, record_removal
+from src.utils.events import broker, event_stream_response
+from src.utils import latest_updates
+from src.utils.trending import record_activity
+from src.utils.views import record_view
+from src.utils.recommendations import get_similar
+from src.utils.tags import split_genres, tag_filter, facet_counts, facets
+from src.utils.suggest import suggest_index
+from src.utils.fuzzy import fuzzy_index
+from src.utils.fragments import manga_fragments, manga_key_columns, bump_manga_versions
+from src.utils.replica import read_from_replica, use_primary
+from src.utils.pagination import pagination_args
+from src.utils.ratelimit import rate_limit
+from src.utils.query_budget import query_budget
+from sqlalchemy.orm import selectinload
 import json
 import os
 from werkzeug.utils import secure_filename
 
 manga_bp = Blueprint('manga', __name__)
 
+# Catalog reads are served by the replica when one is configured
+manga_bp.before_request(read_from_replica)
+
+def parse_images(images):
+    try:
+        return json.loads(images) if images else []
+    except (TypeError, ValueError):
+        return []
+
+def chapter_neighbors(chapter):
+    """Return the previous and next chapter rows using the (manga_id, chapter_number) index"""
+    columns = (Chapter.id, Chapter.chapter_number, Chapter.images)
+    previous_chapter = db.session.execute(
+        db.select(*columns)
+        .where(Chapter.manga_id == chapter.manga_id, Chapter.chapter_number < chapter.chapter_number)
+        .order_by(Chapter.chapter_number.desc())
+        .limit(1)
+    ).first()
+    next_chapter = db.session.execute(
+        db.select(*columns)
+        .where(Chapter.manga_id == chapter.manga_id, Chapter.chapter_number > chapter.chapter_number)
+        .order_by(Chapter.chapter_number)
+        .limit(1)
+    ).first()
+    return previous_chapter, next_chapter
+
+def preload_links(chapter, next_chapter):
+    """Build Link header values hinting the pages the reader needs next"""
+    links = [
+        f'<{image}>; rel=preload; as=image'
+        for image in parse_images(chapter.images)[:current_app.config.get('CHAPTER_PRELOAD_PAGES', 3)]
+    ]
+    if next_chapter:
+        next_images = parse_images(next_chapter.images)
+        if next_images:
+            links.append(f'<{next_images[0]}>; rel=prefetch; as=image')
+    return links
+
+def filter_manga(query):
+    """Apply the search, genre and status filters from the query string.
+
+    Returns the filtered query and a key identifying the filter combination.
+    `genre` takes comma separated names, `genre_mode=any` matches manga with
+    at least one of them instead of all. With `search_mode=fuzzy` the search
+    goes through the trigram index and results are ordered by similarity.
+    """
+    search = request.args.get('search', '').strip()
+    fuzzy = request.args.get('search_mode') == 'fuzzy'
+    genres = sorted(slug for _, slug in split_genres(request.args.get('genre', '')))
+    match_all = request.args.get('genre_mode', 'all') != 'any'
+    status = request.args.get('status', '').strip()
+    
+    if search and fuzzy:
+        ranked = fuzzy_index.search(search, current_app.config.get('FUZZY_MAX_RESULTS', 200))
+        if ranked:
+            ranks = {manga_id: rank for rank, (manga_id, _) in enumerate(ranked)}
+            query = query.filter(Manga.id.in_(ranks)).order_by(db.case(ranks, value=Manga.id))
+        else:
+            query = query.filter(db.false())
+    elif search:
+        query = query.filter(
+            db.or_(
+                Manga.title.contains(search),
+                Manga.arabic_title.contains(search),
+                Manga.description.contains(search)
+            )
+        )
+    
+    if genres:
+        query = query.filter(tag_filter(genres, match_all))
+    
+    if status:
+        query = query.filter(Manga.status == status)
+    
+    return query, (search, fuzzy, tuple(genres), match_all or len(genres) < 2, status)
+
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @manga_bp.route('/', methods=['GET'])
+@query_budget(4)
 def get_manga_list():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '').strip()
-        genre = request.args.get('genre', '').strip()
-        status = request.args.get('status', '').strip()
-        sort_by = request.args.get('sort_by', 'updated_at')  # updated_at, rating, title
-        
-        query = Manga.query
-        
-        # Apply filters
-        if search:
-            query = query.filter(
-                db.or_(
-                    Manga.title.contains(search),
-                    Manga.arabic_title.contains(search),
-                    Manga.description.contains(search)
-                )
-            )
+        page, per_page = pagination_args(20)
+        search_mode = request.args.get('search_mode', 'contains')  # contains, fuzzy
+        default_sort = 'relevance' if search_mode == 'fuzzy' else 'updated_at'
+        sort_by = request.args.get('sort_by', default_sort)  # updated_at, rating, title, views, trending, popular, relevance
+        window = request.args.get('window', 'weekly')  # daily, weekly, all (for popular)
         
-        if genre:
-            query = query.filter(Manga.genre.contains(genre))
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError:
+            return jsonify({'error': 'الحقول المطلوبة غير صحيحة'}), 400
         
-        if status:
-            query = query.filter(Manga.status == status)
+        # Apply filters, fuzzy searches come back ordered by similarity
+        query, _ = filter_manga(Manga.query)
+        if sort_by != 'relevance':
+            query = query.order_by(None)
         
         # Apply sorting
-        if sort_by == 'rating':
+        if sort_by == 'relevance' and search_mode == 'fuzzy':
+            query = query.order_by(Manga.id.desc())
+        elif sort_by == 'rating':
             # This is a simplified sorting, in production you'd want to calculate average ratings
             query = query.order_by(Manga.id.desc())
         elif sort_by == 'title':
             query = query.order_by(Manga.arabic_title)
+        elif sort_by == 'views':
+            query = query.order_by(Manga.views.desc(), Manga.id.desc())
+        elif sort_by in ('trending', 'popular'):
+            if sort_by == 'trending':
+                score_column = MangaScore.trending
+            elif window == 'daily':
+                score_column = MangaScore.popular_daily
+            elif window == 'all':
+                score_column = MangaScore.popular_all
+            else:
+                score_column = MangaScore.popular_weekly
+            # Every manga has a score row, the inner join walks the score index in order
+            query = query.join(MangaScore, MangaScore.manga_id == Manga.id).order_by(
+                score_column.desc(), MangaScore.manga_id.desc()
+            )
         else:  # updated_at
             query = query.order_by(Manga.updated_at.desc())
         
-        # Paginate
-        pagination = query.paginate(
+        # Paginate over the fragment keys only, the manga come from the cache
+        pagination = query.with_entities(*manga_key_columns()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
-        manga_list = [manga.to_dict() for manga in pagination.items]
+        manga_list = [manga for manga in manga_fragments(pagination.items, fields) if manga]
         
         return jsonify({
             'manga': manga_list,
@@ -70,14 +171,63 @@ def get_manga_list():
     except Exception as e:
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@manga_bp.route('/suggest', methods=['GET'])
+@query_budget(1)
+def suggest_manga():
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+        
+        return jsonify({'suggestions': suggest_index.search(query, limit)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@manga_bp.route('/facets', methods=['GET'])
+@query_budget(1)
+def get_facets():
+    try:
+        query, key = filter_manga(Manga.query)
+        return jsonify(facets.get(key, lambda: facet_counts(query))), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@manga_bp.route('/latest-updates', methods=['GET'])
+@query_budget(1)
+def get_latest_updates():
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        cursor = request.args.get('cursor', '').strip()
+        
+        try:
+            cursor = latest_updates.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'المؤشر غير صحيح'}), 400
+        
+        items = latest_updates.get_page(limit, cursor)
+        
+        return jsonify({
+            'updates': items,
+            'next_cursor': latest_updates.next_cursor(items, limit)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
 @manga_bp.route('/<int:manga_id>', methods=['GET'])
+@query_budget(11)
 def get_manga_details(manga_id):
     try:
-        manga = Manga.query.get(manga_id)
+        manga = manga_fragments(db.session.execute(
+            db.select(*manga_key_columns()).where(Manga.id == manga_id)
+        ).all())
         
-        if not manga:
+        if not manga or not manga[0]:
             return jsonify({'error': 'المانجا غير موجودة'}), 404
         
+        record_view(manga_id)
+        
         # Get user's reading progress if authenticated
         reading_progress = None
         is_favorite = False
@@ -106,16 +256,36 @@ def get_manga_details(manga_id):
         except:
             pass
         
-        # Get chapters
-        chapters = Chapter.query.filter_by(manga_id=manga_id).order_by(Chapter.chapter_number).all()
+        # Only the latest chapters are embedded, the rest are paged from /chapters
+        latest_limit = current_app.config.get('MANGA_DETAILS_CHAPTERS', 20)
+        chapters = db.session.execute(
+            db.select(*chapter_columns())
+            .where(Chapter.manga_id == manga_id)
+            .order_by(Chapter.chapter_number.desc())
+            .limit(latest_limit)
+        ).all()
+        
+        first_chapter = db.session.execute(
+            db.select(Chapter.id, Chapter.chapter_number)
+            .where(Chapter.manga_id == manga_id)
+            .order_by(Chapter.chapter_number)
+            .limit(1)
+        ).first()
         
         # Get recent reviews
-        reviews = Review.query.filter_by(manga_id=manga_id).order_by(Review.created_at.desc()).limit(10).all()
+        reviews = Review.query.filter_by(manga_id=manga_id).options(selectinload(Review.user)).order_by(
+            Review.created_at.desc()
+        ).limit(10).all()
         
-        manga_data = manga.to_dict()
+        manga_data = manga[0]
         manga_data.update({
-            'chapters': [chapter.to_dict() for chapter in chapters],
+            'chapters': [row_to_dict(chapter, CHAPTER_LIST_FIELDS) for chapter in chapters],
+            'first_chapter': {
+                'id': first_chapter.id,
+                'chapter_number': first_chapter.chapter_number
+            } if first_chapter else None,
             'reviews': [review.to_dict() for review in reviews],
+            'similar': get_similar(manga_id),
             'reading_progress': reading_progress,
             'is_favorite': is_favorite,
             'user_rating': user_rating
@@ -126,19 +296,68 @@ def get_manga_details(manga_id):
     except Exception as e:
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@manga_bp.route('/<int:manga_id>/chapters', methods=['GET'])
+@query_budget(3)
+def get_manga_chapters(manga_id):
+    try:
+        page, per_page = pagination_args(50)
+        order = request.args.get('order', 'asc')  # asc, desc
+        
+        if not db.session.get(Manga, manga_id):
+            return jsonify({'error': 'المانجا غير موجودة'}), 404
+        
+        query = Chapter.query.filter_by(manga_id=manga_id)
+        
+        if order == 'desc':
+            query = query.order_by(Chapter.chapter_number.desc())
+        else:
+            query = query.order_by(Chapter.chapter_number)
+        
+        pagination = query.with_entities(*chapter_columns()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        chapters = [row_to_dict(row, CHAPTER_LIST_FIELDS) for row in pagination.items]
+        
+        return jsonify({
+            'chapters': chapters,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination.total,
+                'pages': pagination.pages,
+                'has_next': pagination.has_next,
+                'has_prev': pagination.has_prev
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
 @manga_bp.route('/<int:manga_id>/chapters/<int:chapter_id>', methods=['GET'])
+@query_budget(7)
 def get_chapter_details(manga_id, chapter_id):
     try:
-        chapter = Chapter.query.filter_by(id=chapter_id, manga_id=manga_id).first()
+        # The average comes with the row instead of loading every rating
+        row = db.session.execute(
+            db.select(Chapter, chapter_average_rating().label('average_rating'))
+            .filter_by(id=chapter_id, manga_id=manga_id)
+        ).first()
         
-        if not chapter:
+        if not row:
             return jsonify({'error': 'الفصل غير موجود'}), 404
         
+        chapter, average_rating = row
+        record_activity(manga_id, 'views')
+        record_view(manga_id, chapter_id)
+        
         # Update reading progress if user is authenticated
         try:
             verify_jwt_in_request(optional=True)
             user_id = get_jwt_identity()
             if user_id:
+                # The progress row is read and updated, it must come from the primary
+                use_primary()
                 progress = ReadingProgress.query.filter_by(
                     user_id=user_id, manga_id=manga_id
                 ).first()
@@ -150,29 +369,56 @@ def get_chapter_details(manga_id, chapter_id):
                         last_chapter_read=chapter.chapter_number
                     )
                     db.session.add(progress)
+                    record_activity(manga_id, 'reads')
                 else:
                     if chapter.chapter_number > progress.last_chapter_read:
                         progress.last_chapter_read = chapter.chapter_number
+                        record_activity(manga_id, 'reads')
                 
                 db.session.commit()
         except:
             pass
         
         # Get comments
-        comments = Comment.query.filter_by(chapter_id=chapter_id).order_by(
+        comments = Comment.query.filter_by(chapter_id=chapter_id).options(selectinload(Comment.user)).order_by(
             Comment.is_pinned.desc(), Comment.created_at.desc()
         ).all()
         
-        chapter_data = chapter.to_dict()
-        chapter_data['comments'] = [comment.to_dict() for comment in comments]
+        previous_chapter, next_chapter = chapter_neighbors(chapter)
         
-        return jsonify({'chapter': chapter_data}), 200
+        chapter_data = chapter.to_dict(average_rating=average_rating)
+        chapter_data['comments'] = [comment.to_dict() for comment in comments]
+        chapter_data['previous_chapter'] = {
+            'id': previous_chapter.id,
+            'chapter_number': previous_chapter.chapter_number
+        } if previous_chapter else None
+        chapter_data['next_chapter'] = {
+            'id': next_chapter.id,
+            'chapter_number': next_chapter.chapter_number
+        } if next_chapter else None
+        
+        response = jsonify({'chapter': chapter_data})
+        links = preload_links(chapter, next_chapter)
+        if links:
+            response.headers['Link'] = ', '.join(links)
+        
+        return response, 200
         
     except Exception as e:
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@manga_bp.route('/<int:manga_id>/events', methods=['GET'])
+def stream_manga_events(manga_id):
+    return event_stream_response(f'manga:{manga_id}')
+
+@manga_bp.route('/<int:manga_id>/chapters/<int:chapter_id>/events', methods=['GET'])
+def stream_chapter_events(manga_id, chapter_id):
+    return event_stream_response(f'chapter:{chapter_id}')
+
 @manga_bp.route('/<int:manga_id>/rate', methods=['POST'])
+@query_budget(4)
 @jwt_required()
+@rate_limit('rate')
 def rate_manga(manga_id):
     try:
         user_id = get_jwt_identity()
@@ -205,7 +451,10 @@ def rate_manga(manga_id):
             )
             db.session.add(new_rating)
         
+        # The average rating is part of the manga's cached fragment
+        bump_manga_versions(Manga.id == manga_id)
         db.session.commit()
+        record_activity(manga_id, 'ratings')
         
         return jsonify({'message': 'تم تقييم المانجا بنجاح'}), 200
         
@@ -214,6 +463,7 @@ def rate_manga(manga_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/<int:manga_id>/chapters/<int:chapter_id>/rate', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def rate_chapter(manga_id, chapter_id):
     try:
@@ -248,6 +498,7 @@ def rate_chapter(manga_id, chapter_id):
             db.session.add(new_rating)
         
         db.session.commit()
+        record_activity(manga_id, 'ratings')
         
         return jsonify({'message': 'تم تقييم الفصل بنجاح'}), 200
         
@@ -256,6 +507,7 @@ def rate_chapter(manga_id, chapter_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/<int:manga_id>/review', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def add_review(manga_id):
     try:
@@ -304,7 +556,9 @@ def add_review(manga_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/<int:manga_id>/chapters/<int:chapter_id>/comments', methods=['POST'])
+@query_budget(5)
 @jwt_required()
+@rate_limit('comment')
 def add_comment(manga_id, chapter_id):
     try:
         user_id = get_jwt_identity()
@@ -337,9 +591,12 @@ def add_comment(manga_id, chapter_id):
         db.session.add(new_comment)
         db.session.commit()
         
+        comment_data = new_comment.to_dict()
+        broker.publish(f'chapter:{chapter_id}', 'comment', comment_data)
+        
         return jsonify({
             'message': 'تم إضافة التعليق بنجاح',
-            'comment': new_comment.to_dict()
+            'comment': comment_data
         }), 201
         
     except Exception as e:
@@ -347,6 +604,7 @@ def add_comment(manga_id, chapter_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/<int:manga_id>/favorite', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def toggle_favorite(manga_id):
     try:
@@ -361,6 +619,7 @@ def toggle_favorite(manga_id):
         ).first()
         
         if existing_favorite:
+            record_removal(user_id, 'favorite', existing_favorite.id, manga_id)
             db.session.delete(existing_favorite)
             message = 'تم إزالة المانجا من المفضلة'
             is_favorite = False
@@ -372,6 +631,9 @@ def toggle_favorite(manga_id):
         
         db.session.commit()
         
+        if is_favorite:
+            record_activity(manga_id, 'favorites')
+        
         return jsonify({
             'message': message,
             'is_favorite': is_favorite
@@ -382,18 +644,33 @@ def toggle_favorite(manga_id):
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/favorites', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_user_favorites():
     try:
         user_id = get_jwt_identity()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        pagination = Favorite.query.filter_by(user_id=user_id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        page, per_page = pagination_args(20)
         
-        favorites = [favorite.to_dict() for favorite in pagination.items]
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError:
+            return jsonify({'error': 'الحقول المطلوبة غير صحيحة'}), 400
+        
+        query = db.session.query(
+            Favorite.id, Favorite.user_id, Favorite.manga_id, Favorite.created_at,
+            *manga_key_columns(prefix='manga_')
+        ).join(Manga, Favorite.manga_id == Manga.id).filter(Favorite.user_id == user_id)
+        
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        manga_list = manga_fragments(pagination.items, fields, prefix='manga_')
+        
+        favorites = [{
+            'id': row.id,
+            'user_id': row.user_id,
+            'manga_id': row.manga_id,
+            'manga': manga,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        } for row, manga in zip(pagination.items, manga_list) if manga]
         
         return jsonify({
             'favorites': favorites,
@@ -411,18 +688,35 @@ def get_user_favorites():
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
 @manga_bp.route('/reading-progress', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_reading_progress():
     try:
         user_id = get_jwt_identity()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page, per_page = pagination_args(20)
         
-        pagination = ReadingProgress.query.filter_by(user_id=user_id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        progress_list = [progress.to_dict() for progress in pagination.items]
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError:
+            return jsonify({'error': 'الحقول المطلوبة غير صحيحة'}), 400
+        
+        query = db.session.query(
+            ReadingProgress.id, ReadingProgress.user_id, ReadingProgress.manga_id,
+            ReadingProgress.last_chapter_read, ReadingProgress.updated_at,
+            *manga_key_columns(prefix='manga_')
+        ).join(Manga, ReadingProgress.manga_id == Manga.id).filter(ReadingProgress.user_id == user_id)
+        
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        manga_list = manga_fragments(pagination.items, fields, prefix='manga_')
+        
+        progress_list = [{
+            'id': row.id,
+            'user_id': row.user_id,
+            'manga_id': row.manga_id,
+            'manga': manga,
+            'last_chapter_read': row.last_chapter_read,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        } for row, manga in zip(pagination.items, manga_list) if manga]
         
         return jsonify({
             'reading_progress': progress_list,
@@ -439,3 +733,22 @@ def get_reading_progress():
     except Exception as e:
         return jsonify({'error': 'حدث خطأ في الخادم'}), 500
 
+@manga_bp.route('/sync', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+def sync_user_library():
+    try:
+        user_id = get_jwt_identity()
+        token = request.args.get('since', '').strip()
+        
+        since = None
+        if token:
+            try:
+                since = decode_token(token)
+            except ValueError:
+                return jsonify({'error': 'رمز المزامنة غير صحيح'}), 400
+        
+        return jsonify(collect_changes(user_id, since)), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
@@ -0,0 +1,90 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, Manga, Chapter, Notification
+from src.utils.fields import manga_columns, row_to_dict
+from src.utils.notifications import unread_count, mark_read
+from src.utils.pagination import pagination_args
+
+notifications_bp = Blueprint('notifications', __name__)
+
+NOTIFICATION_MANGA_FIELDS = ('id', 'title', 'arabic_title', 'cover_image')
+
+@notifications_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_notifications():
+    try:
+        user_id = get_jwt_identity()
+        page, per_page = pagination_args(20)
+        
+        query = db.session.query(
+            Notification.id, Notification.kind, Notification.is_read, Notification.created_at,
+            Notification.chapter_id, Chapter.chapter_number,
+            *manga_columns(NOTIFICATION_MANGA_FIELDS, prefix='manga_')
+        ).join(Manga, Notification.manga_id == Manga.id).outerjoin(
+            Chapter, Notification.chapter_id == Chapter.id
+        ).filter(Notification.user_id == user_id).order_by(Notification.id.desc())
+        
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        notifications = [{
+            'id': row.id,
+            'kind': row.kind,
+            'is_read': row.is_read,
+            'manga': row_to_dict(row, NOTIFICATION_MANGA_FIELDS, prefix='manga_'),
+            'chapter_id': row.chapter_id,
+            'chapter_number': row.chapter_number,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        } for row in pagination.items]
+        
+        return jsonify({
+            'notifications': notifications,
+            'unread': unread_count(user_id),
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination.total,
+                'pages': pagination.pages,
+                'has_next': pagination.has_next,
+                'has_prev': pagination.has_prev
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@notifications_bp.route('/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    try:
+        return jsonify({'unread': unread_count(get_jwt_identity())}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@notifications_bp.route('/read', methods=['POST'])
+@jwt_required()
+def mark_all_read():
+    try:
+        user_id = get_jwt_identity()
+        changed = mark_read(user_id)
+        db.session.commit()
+        
+        return jsonify({'message': 'تم تحديد الإشعارات كمقروءة', 'updated': changed}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
+
+@notifications_bp.route('/<int:notification_id>/read', methods=['POST'])
+@jwt_required()
+def mark_notification_read(notification_id):
+    try:
+        user_id = get_jwt_identity()
+        changed = mark_read(user_id, notification_id)
+        db.session.commit()
+        
+        return jsonify({'message': 'تم تحديد الإشعار كمقروء', 'updated': changed}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'حدث خطأ في الخادم'}), 500
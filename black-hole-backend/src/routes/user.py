@@ -1,28 +1,42 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from src.models.user import User, Manga, Rating, db
+from src.routes.auth import hashing_busy
+from src.utils.fragments import bump_manga_versions
+from src.utils.passwords import PasswordHashBusy
+from src.utils.query_budget import query_budget
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
+@query_budget(1)
 def get_users():
     users = User.query.all()
     return jsonify([user.to_dict() for user in users])
 
 @user_bp.route('/users', methods=['POST'])
+@query_budget(2)
 def create_user():
     
     data = request.json
+    if not data.get('password'):
+        return jsonify({'error': 'كلمة المرور مطلوبة'}), 400
     user = User(username=data['username'], email=data['email'])
+    try:
+        user.set_password(data['password'])
+    except PasswordHashBusy:
+        return hashing_busy()
     db.session.add(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@query_budget(1)
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
+@query_budget(3)
 def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.json
@@ -32,8 +46,11 @@ def update_user(user_id):
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@query_budget(17)
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
+    # The user's ratings go with them and change those manga's averages
+    bump_manga_versions(Manga.id.in_(db.select(Rating.manga_id).where(Rating.user_id == user_id)))
     db.session.delete(user)
     db.session.commit()
     return '', 204
@@ -0,0 +1,172 @@
+import threading
+import time
+from flask import jsonify, request
+
+# Route classes: in-flight limit per process, how long a request may wait
+# for a slot, the queue wait (from X-Request-Start) after which it is not
+# worth serving, the Retry-After hint, and whether it is shed first
+DEFAULT_CLASSES = {
+    'chapter': {'limit': 64, 'wait': 2.0, 'max_queue_wait': 10.0, 'retry_after': 1, 'sheddable': False},
+    'read': {'limit': 32, 'wait': 1.0, 'max_queue_wait': 5.0, 'retry_after': 2, 'sheddable': False},
+    'search': {'limit': 16, 'wait': 0.2, 'max_queue_wait': 2.0, 'retry_after': 5, 'sheddable': True},
+    'write': {'limit': 16, 'wait': 1.0, 'max_queue_wait': 5.0, 'retry_after': 2, 'sheddable': False},
+    'admin': {'limit': 4, 'wait': 2.0, 'max_queue_wait': 10.0, 'retry_after': 5, 'sheddable': False},
+    'upload': {'limit': 4, 'wait': 0.5, 'max_queue_wait': 5.0, 'retry_after': 10, 'sheddable': True},
+}
+
+CHAPTER_ENDPOINTS = {'manga.get_chapter_details', 'manga.get_manga_chapters'}
+SEARCH_ENDPOINTS = {'manga.get_manga_list', 'manga.get_facets'}
+
+# Long lived streams and static files are never queued or shed. Batches
+# are admitted item by item, under each sub-request's own class.
+EXEMPT_ENDPOINTS = {'manga.stream_manga_events', 'manga.stream_chapter_events', 'serve', 'static', 'batch.run_batch'}
+
+
+def classify_request():
+    """Return the route class of the current request, None when exempt"""
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+        return None
+    if request.method == 'OPTIONS':
+        return None  # CORS preflights are answered without running the view
+    if request.blueprint == 'admin':
+        return 'admin'
+    if request.mimetype == 'multipart/form-data':
+        return 'upload'
+    if request.method not in ('GET', 'HEAD'):
+        return 'write'
+    if endpoint in CHAPTER_ENDPOINTS:
+        return 'chapter'
+    if endpoint in SEARCH_ENDPOINTS:
+        return 'search'
+    return 'read'
+
+
+def queue_wait():
+    """Seconds the request spent queued before reaching the app.
+
+    Read from the X-Request-Start header a proxy adds on arrival
+    (`t=<seconds or milliseconds since the epoch>`), None without it.
+    """
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e11:  # milliseconds
+        started /= 1000
+    return max(time.time() - started, 0)
+
+
+class RouteClassState:
+    def __init__(self, name, limit, wait, max_queue_wait, retry_after, sheddable):
+        self.name = name
+        self.wait = wait
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+        self.sheddable = sheddable
+        self.slots = threading.BoundedSemaphore(limit)
+        self.limit = limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class AdmissionController:
+    """Per-process in-flight limits with fail fast rejection.
+
+    Each route class gets `limit` concurrent requests. Further requests
+    wait up to `wait` seconds for a slot and are rejected with 503 after
+    that. Sheddable classes (expensive searches, uploads) are rejected
+    straight away once the process is busier than `shed_ratio` of its
+    total capacity, which keeps room for chapter reads. Limits are per
+    process, so they only bite with threaded workers; the X-Request-Start
+    check applies to every worker type.
+    """
+
+    def __init__(self, classes=DEFAULT_CLASSES, shed_ratio=0.75):
+        self.configure(classes, shed_ratio)
+
+    def configure(self, classes, shed_ratio):
+        self.classes = {name: RouteClassState(name, **options) for name, options in classes.items()}
+        self.capacity = sum(state.limit for state in self.classes.values())
+        self.shed_ratio = shed_ratio
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _count(self, state, delta):
+        with self._lock:
+            state.in_flight += delta
+            self._in_flight += delta
+
+    def admit(self, name):
+        """Take a slot for the route class, returns False when the request is shed"""
+        state = self.classes[name]
+
+        waited = queue_wait()
+        if waited is not None and waited > state.max_queue_wait:
+            state.rejected += 1
+            return False
+
+        if state.sheddable and self._in_flight >= self.capacity * self.shed_ratio:
+            state.rejected += 1
+            return False
+
+        if not state.slots.acquire(timeout=state.wait):
+            state.rejected += 1
+            return False
+
+        self._count(state, 1)
+        state.admitted += 1
+        return True
+
+    def release(self, name):
+        state = self.classes[name]
+        self._count(state, -1)
+        state.slots.release()
+
+    def stats(self):
+        return {
+            name: {
+                'limit': state.limit,
+                'in_flight': state.in_flight,
+                'admitted': state.admitted,
+                'rejected': state.rejected
+            }
+            for name, state in self.classes.items()
+        }
+
+
+admission = AdmissionController()
+
+
+def admit_request():
+    route_class = classify_request()
+    if route_class is None:
+        return None
+    if not admission.admit(route_class):
+        response = jsonify({'error': 'الخادم مشغول حالياً، يرجى المحاولة لاحقاً'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(admission.classes[route_class].retry_after)
+        return response
+    # Kept on the request, not on g, which batch sub-requests share
+    request.environ['admission.class'] = route_class
+    return None
+
+
+def release_request(exception=None):
+    route_class = request.environ.pop('admission.class', None)
+    if route_class is not None:
+        admission.release(route_class)
+
+
+def init_admission(app):
+    app.config.setdefault('ADMISSION_ENABLED', True)
+    app.config.setdefault('ADMISSION_CLASSES', DEFAULT_CLASSES)
+    app.config.setdefault('ADMISSION_SHED_RATIO', 0.75)  # share of capacity in use before shedding
+    if not app.config['ADMISSION_ENABLED']:
+        return
+
+    admission.configure(app.config['ADMISSION_CLASSES'], app.config['ADMISSION_SHED_RATIO'])
+    app.before_request(admit_request)
+    app.teardown_request(release_request)
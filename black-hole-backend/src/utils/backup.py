@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import click
+from sqlalchemy.engine import make_url
+
+BACKUP_JOB = 'backup'
+SNAPSHOT_PREFIX = 'app-'
+SQLITE_SUFFIX = '.db.gz'
+POSTGRES_SUFFIX = '.dump'
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def copy_sqlite(source, target, pages=-1, pause=0, max_restarts=3):
+    """Copy one SQLite database file into another with the online backup API.
+
+    With `pages` > 0 the copy runs in steps of that many pages and sleeps
+    `pause` seconds between steps, so writers only wait for one step at a
+    time. SQLite starts over whenever another connection writes to the
+    source in between; after `max_restarts` of those the copy is done in a
+    single step instead, which makes writers wait for one full pass.
+    """
+    restarts, last_remaining = 0, None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(pause)
+
+    source_db, target_db = sqlite3.connect(source, timeout=30), sqlite3.connect(target, timeout=30)
+    try:
+        if pages > 0:
+            try:
+                source_db.backup(target_db, pages=pages, progress=progress)
+                return
+            except _TooManyRestarts:
+                pass
+        source_db.backup(target_db)
+    finally:
+        source_db.close()
+        target_db.close()
+
+
+def vacuum_into(source, target):
+    """Write a compacted copy of the database in one read transaction.
+
+    Writers are only held back for the whole copy in rollback journal mode;
+    with WAL they keep committing while it runs.
+    """
+    source_db = sqlite3.connect(source)
+    try:
+        source_db.execute('VACUUM INTO ?', (target,))
+    finally:
+        source_db.close()
+
+
+def sqlite_check(path):
+    """Run an integrity check and return {table: row count}"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+        if result != 'ok':
+            raise BackupError(f'{path} failed the integrity check: {result}')
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        connection.close()
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_checksum(path):
+    """Store the checksum next to the snapshot in `sha256sum -c` format"""
+    with open(f'{path}.sha256', 'w') as file:
+        file.write(f'{file_checksum(path)}  {os.path.basename(path)}\n')
+
+
+def verify_checksum(path):
+    try:
+        with open(f'{path}.sha256') as file:
+            expected = file.read().split()[0]
+    except (OSError, IndexError):
+        raise BackupError(f'No checksum found for {path}')
+    if file_checksum(path) != expected:
+        raise BackupError(f'{path} does not match its checksum')
+
+
+def list_snapshots(folder):
+    """Snapshots in `folder`, oldest first"""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith((SQLITE_SUFFIX, POSTGRES_SUFFIX))
+    )
+
+
+def rotate_snapshots(folder, keep):
+    """Delete all but the `keep` newest snapshots, returns the removed paths"""
+    removed = list_snapshots(folder)[:-keep] if keep > 0 else []
+    for path in removed:
+        for file in (path, f'{path}.sha256'):
+            if os.path.exists(file):
+                os.remove(file)
+    return removed
+
+
+def pg_environment(url):
+    """Connection settings for pg_dump/pg_restore, keeping the password off the command line"""
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    args = ['--dbname', url.database or '']
+    if url.host:
+        args += ['--host', url.host]
+    if url.port:
+        args += ['--port', str(url.port)]
+    if url.username:
+        args += ['--username', url.username]
+    return args, env
+
+
+def create_snapshot(database_uri, folder, method='backup', pages=1024, pause=0.05, keep=7):
+    """Take a compressed, checksummed snapshot of the database, returns its path"""
+    url = make_url(database_uri)
+    os.makedirs(folder, exist_ok=True)
+    # Microseconds keep the safety snapshot of a restore apart from one taken the same second
+    name = SNAPSHOT_PREFIX + datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')
+
+    if url.get_backend_name() == 'sqlite':
+        if not url.database or url.database == ':memory:':
+            raise BackupError('In-memory databases cannot be backed up')
+        path = os.path.join(folder, name + SQLITE_SUFFIX)
+        fd, copy = tempfile.mkstemp(suffix='.db', dir=folder)
+        os.close(fd)
+        try:
+            if method == 'vacuum':
+                os.remove(copy)  # VACUUM INTO needs a new file
+                vacuum_into(url.database, copy)
+            else:
+                copy_sqlite(url.database, copy, pages=pages, pause=pause)
+            sqlite_check(copy)
+            with open(copy, 'rb') as source, gzip.open(f'{path}.partial', 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        finally:
+            if os.path.exists(copy):
+                os.remove(copy)
+    elif url.get_backend_name() == 'postgresql':
+        # pg_dump reads from one MVCC snapshot without blocking writers,
+        # the custom format is compressed and restorable with pg_restore
+        path = os.path.join(folder, name + POSTGRES_SUFFIX)
+        args, env = pg_environment(url)
+        subprocess.run(['pg_dump', '--format=custom', '--no-owner', '--file', f'{path}.partial', *args],
+                       env=env, check=True)
+    else:
+        raise BackupError(f'Backups are not supported for {url.get_backend_name()}')
+
+    try:
+        # Unlike a rename, a link never replaces an existing snapshot
+        os.link(f'{path}.partial', path)
+    except FileExistsError:
+        raise BackupError(f'{path} already exists')
+    finally:
+        os.remove(f'{path}.partial')
+    write_checksum(path)
+    rotate_snapshots(folder, keep)
+    return path
+
+
+def restore_snapshot(database_uri, path, folder, pages=1024, pause=0.05):
+    """Verify a snapshot and restore it over the database.
+
+    The current database is snapshotted first. Returns the table row
+    counts of the restored SQLite database, None for PostgreSQL.
+    """
+    verify_checksum(path)
+    url = make_url(database_uri)
+
+    if url.get_backend_name() == 'postgresql':
+        if not path.endswith(POSTGRES_SUFFIX):
+            raise BackupError(f'{path} is not a PostgreSQL dump')
+        args, env = pg_environment(url)
+        subprocess.run(['pg_restore', '--list', path], env=env, check=True, stdout=subprocess.DEVNULL)
+        create_snapshot(database_uri, folder, keep=0)
+        subprocess.run(['pg_restore', '--clean', '--if-exists', '--no-owner', '--single-transaction', *args, path],
+                       env=env, check=True)
+        return None
+
+    if not path.endswith(SQLITE_SUFFIX):
+        raise BackupError(f'{path} is not a SQLite snapshot')
+    fd, copy = tempfile.mkstemp(suffix='.db', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as target, gzip.open(path, 'rb') as source:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        expected = sqlite_check(copy)
+        if os.path.exists(url.database):
+            create_snapshot(database_uri, folder, keep=0)
+        # Written through the backup API so open connections see a consistent switch
+        copy_sqlite(copy, url.database, pages=pages, pause=pause)
+    finally:
+        os.remove(copy)
+
+    restored = sqlite_check(url.database)
+    if restored != expected:
+        raise BackupError('The restored database does not match the snapshot')
+    return restored
+
+
+def backup_options(app):
+    config = app.config
+    return {
+        'folder': config['BACKUP_FOLDER'],
+        'method': config['BACKUP_METHOD'],
+        'pages': config['BACKUP_PAGES_PER_STEP'],
+        'pause': config['BACKUP_STEP_PAUSE'],
+        'keep': config['BACKUP_KEEP'],
+    }
+
+
+def init_backup(app):
+    app.config.setdefault('BACKUP_FOLDER', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'backups'))
+    app.config.setdefault('BACKUP_INTERVAL', 0)  # seconds between scheduled snapshots, 0 disables them
+    app.config.setdefault('BACKUP_KEEP', 7)  # snapshots kept by rotation
+    app.config.setdefault('BACKUP_METHOD', 'backup')  # 'backup' (stepped backup API) or 'vacuum' (VACUUM INTO)
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', 1024)  # SQLite pages copied per backup step
+    app.config.setdefault('BACKUP_STEP_PAUSE', 0.05)  # seconds writers get between steps
+
+    def run_backup():
+        return create_snapshot(app.config['SQLALCHEMY_DATABASE_URI'], **backup_options(app))
+
+    interval = app.config['BACKUP_INTERVAL']
+    if interval:
+        from src.utils.scheduler import scheduler, claim_run
+        scheduler.add_job(BACKUP_JOB, interval, lambda: claim_run(BACKUP_JOB, interval) and run_backup())
+
+    @app.cli.command('backup-db')
+    def backup_db_command():
+        """Write a compressed, checksummed snapshot of the database."""
+        try:
+            path = run_backup()
+        except (BackupError, sqlite3.Error, subprocess.CalledProcessError) as e:
+            raise click.ClickException(str(e))
+        print(f'Snapshot written to {path}')
+
+    @app.cli.command('list-backups')
+    def list_backups_command():
+        """List snapshots, oldest first."""
+        for path in list_snapshots(app.config['BACKUP_FOLDER']):
+            print(f'{os.path.basename(path)}  {os.path.getsize(path)} bytes')
+
+    @app.cli.command('restore-db')
+    @click.argument('snapshot')
+    @click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+    def restore_db_command(snapshot, yes):
+        """Verify SNAPSHOT and restore it over the database."""
+        folder = app.config['BACKUP_FOLDER']
+        path = snapshot if os.path.exists(snapshot) else os.path.join(folder, snapshot)
+        if not yes:
+            click.confirm(f'Replace the database with {os.path.basename(path)}?', abort=True)
+        try:
+            counts = restore_snapshot(app.config['SQLALCHEMY_DATABASE_URI'], path, folder,
+                                      app.config['BACKUP_PAGES_PER_STEP'], app.config['BACKUP_STEP_PAUSE'])
+        except (BackupError, sqlite3.Error, OSError, subprocess.CalledProcessError) as e:
+            raise click.ClickException(str(e))
+        print(f'Restored {os.path.basename(path)}')
+        for table, count in (counts or {}).items():
+            print(f'  {table}: {count} rows')
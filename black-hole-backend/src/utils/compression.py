@@ -0,0 +1,82 @@
+import gzip
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'application/x-ndjson',
+}
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported encoding from the Accept-Encoding header"""
+    gzip_quality = accept_encodings.quality('gzip')
+    if brotli is not None:
+        brotli_quality = accept_encodings.quality('br')
+        if brotli_quality and brotli_quality >= gzip_quality:
+            return 'br'
+    if gzip_quality:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """Compress eligible responses according to the negotiated encoding"""
+    config = current_app.config
+
+    if response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+
+    # The body depends on Accept-Encoding even when we end up not compressing
+    response.vary.add('Accept-Encoding')
+
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    else:
+        compressed = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed bytes differ from the identity representation, so a
+    # strong validator would be wrong; keep the tag but mark it weak
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def init_compression(app):
+    """Register negotiated gzip/brotli compression for text responses"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_LEVEL', 5)
+    app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+    app.after_request(compress_response)
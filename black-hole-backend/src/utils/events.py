@@ -0,0 +1,231 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from flask import Response, current_app, request
+from collections import OrderedDict, deque, namedtuple
+
+Event = namedtuple('Event', ['id', 'topic', 'type', 'data'])
+
+
+class Subscription:
+    """A single client's bounded event buffer.
+
+    When the client falls behind and the buffer fills up the subscription
+    is marked as overflowed and stops receiving events. The stream then
+    ends and the client resumes from the topic history with Last-Event-ID.
+    """
+
+    def __init__(self, topic, buffer_size):
+        self.topic = topic
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=buffer_size)
+
+    def push(self, event):
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Return the next event or None when nothing arrived in `timeout`"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drained(self):
+        return self._queue.empty()
+
+
+class SocketBridge:
+    """Relay events between worker processes through unix datagram sockets.
+
+    Each process binds `<directory>/<pid>.sock` and sends every published
+    event to the other sockets in the directory. Sockets left behind by
+    dead processes are removed on the first failed send.
+    """
+
+    def __init__(self, directory, on_event):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, f'{os.getpid()}.sock')
+        self.on_event = on_event
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+
+        thread = threading.Thread(target=self._listen, name='event-bridge', daemon=True)
+        thread.start()
+
+    def send(self, event):
+        payload = json.dumps(list(event), ensure_ascii=False).encode('utf-8')
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.sock') or path == self.path:
+                continue
+            try:
+                self.sock.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                # A peer with a full receive buffer misses this event, its
+                # clients catch up from history on their next reconnect
+                pass
+
+    def _listen(self):
+        while True:
+            try:
+                payload = self.sock.recv(256 * 1024)
+                self.on_event(Event(*json.loads(payload)))
+            except (ValueError, TypeError):
+                continue
+            except OSError:
+                return
+
+
+class EventBroker:
+    """In-process publish/subscribe fan-out with per-topic replay history"""
+
+    def __init__(self, buffer_size=100, history_size=200, max_topics=1000):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        self.max_topics = max_topics
+        self.bridge_directory = None
+
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._history = OrderedDict()
+        self._last_id = 0
+        self._bridge = None
+        self._bridge_pid = None
+
+    def configure(self, buffer_size=None, history_size=None, bridge_directory=None):
+        if buffer_size:
+            self.buffer_size = buffer_size
+        if history_size:
+            self.history_size = history_size
+        self.bridge_directory = bridge_directory
+
+    def _ensure_bridge(self):
+        # Started lazily so every forked worker binds its own socket
+        if not self.bridge_directory or self._bridge_pid == os.getpid():
+            return
+        with self._lock:
+            if self._bridge_pid != os.getpid():
+                self._bridge = SocketBridge(self.bridge_directory, self._dispatch)
+                self._bridge_pid = os.getpid()
+
+    def _next_id(self):
+        # Time based ids stay ordered across processes sharing the bridge
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        return self._last_id
+
+    def publish(self, topic, event_type, data):
+        self._ensure_bridge()
+        with self._lock:
+            event_id = self._next_id()
+        event = Event(event_id, topic, event_type, json.dumps(data, ensure_ascii=False))
+        self._dispatch(event)
+        if self._bridge:
+            self._bridge.send(event)
+        return event
+
+    def _dispatch(self, event):
+        with self._lock:
+            self._last_id = max(self._last_id, event.id)
+
+            history = self._history.get(event.topic)
+            if history is None:
+                history = self._history[event.topic] = deque(maxlen=self.history_size)
+                if len(self._history) > self.max_topics:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end(event.topic)
+            history.append(event)
+
+            subscribers = list(self._subscribers.get(event.topic, ()))
+
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self, topic, last_event_id=None):
+        """Register a subscription, returns it with the events to replay"""
+        self._ensure_bridge()
+        subscription = Subscription(topic, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            backlog = []
+            if last_event_id is not None:
+                backlog = [event for event in self._history.get(topic, ()) if event.id > last_event_id]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+
+broker = EventBroker()
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n'
+
+
+def stream_events(topic, last_event_id=None, heartbeat=15):
+    """Generate a text/event-stream body for one topic"""
+    subscription, backlog = broker.subscribe(topic, last_event_id)
+    try:
+        yield 'retry: 3000\n\n'
+        for event in backlog:
+            yield format_event(event)
+
+        # An overflowed subscription ends once its buffer is flushed
+        while not (subscription.overflowed and subscription.drained()):
+            event = subscription.get(timeout=heartbeat)
+            if event is not None:
+                yield format_event(event)
+            else:
+                yield ': heartbeat\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def event_stream_response(topic):
+    """Build the SSE response for a topic, resuming after Last-Event-ID"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    body = stream_events(topic, last_event_id, current_app.config['EVENTS_HEARTBEAT_INTERVAL'])
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def init_events(app):
+    app.config.setdefault('EVENTS_HEARTBEAT_INTERVAL', 15)  # seconds
+    app.config.setdefault('EVENTS_BUFFER_SIZE', 100)  # events per connection
+    app.config.setdefault('EVENTS_HISTORY_SIZE', 200)  # events kept per topic
+    app.config.setdefault('EVENTS_BRIDGE_DIR', None)  # directory for cross-process relay
+    broker.configure(
+        buffer_size=app.config['EVENTS_BUFFER_SIZE'],
+        history_size=app.config['EVENTS_HISTORY_SIZE'],
+        bridge_directory=app.config['EVENTS_BRIDGE_DIR']
+    )
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+from datetime import datetime
+from src.models.user import db, User, Manga, Chapter, Comment, Rating, Review, Favorite, ReadingProgress
+
+# Tables that can be dumped and loaded back, keyed by URL name
+EXPORT_MODELS = {
+    'users': User,
+    'manga': Manga,
+    'chapters': Chapter,
+    'comments': Comment,
+    'ratings': Rating,
+    'reviews': Review,
+    'favorites': Favorite,
+    'reading_progress': ReadingProgress,
+}
+
+# Columns never written to a dump
+EXCLUDED_COLUMNS = {'verification_code'}
+
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+
+
+def export_columns(model):
+    return [column for column in model.__table__.columns if column.name not in EXCLUDED_COLUMNS]
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(model, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield plain row dicts, fetching `chunk_size` rows per round trip.
+
+    Rows are read through a server-side cursor and never turned into ORM
+    objects, so memory use does not grow with the table size.
+    """
+    columns = export_columns(model)
+    statement = db.select(*columns).order_by(model.__table__.c.id).execution_options(
+        yield_per=chunk_size
+    )
+    names = [column.name for column in columns]
+    for row in db.session.execute(statement):
+        yield {name: encode_value(value) for name, value in zip(names, row)}
+
+
+def generate_ndjson(model):
+    for row in iter_rows(model):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def generate_csv(model):
+    names = [column.name for column in export_columns(model)]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=names)
+    writer.writeheader()
+
+    for index, row in enumerate(iter_rows(model), start=1):
+        writer.writerow(row)
+        # Flush the buffer every chunk instead of building the whole file
+        if index % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def decode_value(column, value):
+    """Convert a dumped value back to the column's Python type"""
+    python_type = column.type.python_type
+    if value is None or (value == '' and python_type is not str):
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is bool:
+        if isinstance(value, str):
+            return value.lower() in ('1', 'true')
+        return bool(value)
+    if python_type in (int, float):
+        return python_type(value)
+    return value
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def load_rows(model, records, batch_size=IMPORT_BATCH_SIZE):
+    """Insert dumped records in executemany batches, returns the row count.
+
+    Unknown keys are ignored. executemany binds the keys of a batch's first
+    row, so records are batched by their set of keys and a record without
+    a column gets its default instead of another record's parameters.
+    The caller owns the transaction.
+    """
+    columns = {column.name: column for column in export_columns(model)}
+    statement = db.insert(model.__table__)
+    batches = {}
+    total = 0
+
+    for record in records:
+        row = {
+            name: decode_value(columns[name], value)
+            for name, value in record.items() if name in columns
+        }
+        batch = batches.setdefault(frozenset(row), [])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(statement, batch)
+            total += len(batch)
+            batch.clear()
+
+    for batch in batches.values():
+        if batch:
+            db.session.execute(statement, batch)
+            total += len(batch)
+
+    return total
@@ -0,0 +1,112 @@
+from datetime import datetime
+from src.models.user import db, Manga, Chapter, Comment, Rating
+
+# All fields exposed by Manga.to_dict(), in output order
+MANGA_FIELDS = (
+    'id', 'title', 'arabic_title', 'description', 'cover_image', 'genre',
+    'status', 'author', 'artist', 'average_rating', 'total_chapters',
+    'views', 'created_at', 'updated_at'
+)
+
+# Compact representation used by grids and user lists
+MANGA_CARD_FIELDS = (
+    'id', 'title', 'arabic_title', 'cover_image', 'genre', 'status',
+    'average_rating', 'total_chapters', 'views', 'updated_at'
+)
+
+
+# Fields of a chapter list entry; pages are only served by the chapter endpoint
+CHAPTER_LIST_FIELDS = (
+    'id', 'manga_id', 'chapter_number', 'title', 'average_rating',
+    'comment_count', 'views', 'created_at', 'updated_at'
+)
+
+
+def parse_fields(value, allowed=MANGA_FIELDS, default=MANGA_CARD_FIELDS):
+    """Parse a comma separated `fields` parameter into an ordered tuple.
+
+    `card` and `full` expand to the default and to every field, so
+    `fields=card,description` extends the compact representation.
+    Returns the default fields when nothing is requested and raises
+    ValueError on unknown field names.
+    """
+    if not value or not value.strip():
+        return default
+
+    requested = set()
+    for field in value.split(','):
+        field = field.strip()
+        if field == 'card':
+            requested.update(default)
+        elif field == 'full':
+            requested.update(allowed)
+        elif field:
+            requested.add(field)
+
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(', '.join(sorted(unknown)))
+
+    # The id is always needed for links, keep output order stable
+    return tuple(field for field in allowed if field == 'id' or field in requested)
+
+
+def manga_columns(fields, prefix=''):
+    """Build the SQL expressions that select only the requested manga fields.
+
+    Each expression is labelled `prefix + field` so the manga columns can be
+    selected next to another entity's columns without name clashes.
+    """
+    columns = []
+    for field in fields:
+        if field == 'average_rating':
+            expression = db.select(
+                db.func.coalesce(db.func.avg(Rating.rating), 0)
+            ).where(Rating.manga_id == Manga.id).scalar_subquery()
+        elif field == 'total_chapters':
+            expression = db.select(
+                db.func.count(Chapter.id)
+            ).where(Chapter.manga_id == Manga.id).scalar_subquery()
+        else:
+            expression = getattr(Manga, field)
+        columns.append(expression.label(prefix + field))
+    return columns
+
+
+def chapter_average_rating():
+    """Correlated average of the ratings of the selected chapter"""
+    return db.select(
+        db.func.coalesce(db.func.avg(Rating.rating), 0)
+    ).where(Rating.chapter_id == Chapter.id).scalar_subquery()
+
+
+def chapter_columns(fields=CHAPTER_LIST_FIELDS):
+    """Build the SQL expressions for chapter list fields.
+
+    Aggregates are correlated subqueries resolved through the chapter_id
+    indexes, so a page of chapters costs one statement instead of one
+    rating and comment load per chapter.
+    """
+    columns = []
+    for field in fields:
+        if field == 'average_rating':
+            expression = chapter_average_rating()
+        elif field == 'comment_count':
+            expression = db.select(
+                db.func.count(Comment.id)
+            ).where(Comment.chapter_id == Chapter.id).scalar_subquery()
+        else:
+            expression = getattr(Chapter, field)
+        columns.append(expression.label(field))
+    return columns
+
+
+def serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def row_to_dict(row, fields, prefix=''):
+    """Convert a projected result row into a dict keyed by field name"""
+    return {field: serialize_value(getattr(row, prefix + field)) for field in fields}
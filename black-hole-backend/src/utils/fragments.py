@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from src.models.user import db, Manga
+from src.utils.fields import MANGA_FIELDS, manga_columns, row_to_dict, serialize_value
+
+
+class FragmentCache:
+    """Serialized entities keyed by (type, id, version, updated_at).
+
+    A changed row gets a new key, so a stale fragment is never returned,
+    it just stops being used and is evicted once `max_entries` newer
+    fragments were stored. This holds across worker processes because the
+    version lives in the database.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_many(self, keys):
+        """Return {key: fragment} for the cached keys"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                fragment = self._entries.get(key)
+                if fragment is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = fragment
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, fragment):
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+fragments = FragmentCache()
+
+
+def manga_key_columns(prefix=''):
+    """The columns a manga fragment key is built from, plus the view count"""
+    return (
+        Manga.id.label(prefix + 'id'),
+        Manga.version.label(prefix + 'version'),
+        Manga.updated_at.label(prefix + 'updated_at'),
+        Manga.views.label(prefix + 'views')
+    )
+
+
+# Fragments of each kind and the fields they hold. The description is
+# long and only some responses ask for it, so it is cached on its own and
+# selected only for those.
+FRAGMENT_KINDS = (
+    ('manga', tuple(field for field in MANGA_FIELDS if field != 'description')),
+    ('manga-description', ('description',)),
+)
+
+
+def _manga_key(kind, manga_id, version, updated_at):
+    return (kind, manga_id, version, serialize_value(updated_at))
+
+
+def _load_fragments(kind, kind_fields, rows, prefix):
+    """Fragments of one kind for the rows, in row order, None for deleted manga"""
+    keys = [
+        _manga_key(kind, getattr(row, prefix + 'id'), getattr(row, prefix + 'version'),
+                   getattr(row, prefix + 'updated_at'))
+        for row in rows
+    ]
+    found = fragments.get_many(keys)
+
+    missing = {key[1] for key in keys if key not in found}
+    if missing:
+        loaded = db.session.execute(
+            db.select(Manga.version, *manga_columns(('id', 'updated_at') + kind_fields))
+            .where(Manga.id.in_(missing))
+        ).all()
+        for row in loaded:
+            fragment = row_to_dict(row, kind_fields)
+            key = _manga_key(kind, row.id, row.version, row.updated_at)
+            fragments.put(key, fragment)
+            found[key] = fragment
+        # Rows changed since the key was read are served at their newer version
+        latest = {key[1]: found[key] for key in found}
+        found.update({key: latest[key[1]] for key in keys if key not in found and key[1] in latest})
+
+    return [found.get(key) for key in keys]
+
+
+def manga_fragments(rows, fields=MANGA_FIELDS, prefix=''):
+    """Return the manga dicts for rows selected with manga_key_columns(prefix).
+
+    Cached fragments are reused, the missing ones are loaded with a single
+    query per fragment kind and cached; the description is only loaded when
+    `fields` asks for it. Each dict only contains the requested fields,
+    manga deleted in the meantime come back as None. The view count changes
+    too often to be part of the key, it is taken from the row instead.
+    """
+    merged = [{} for _ in rows]
+    for kind, kind_fields in FRAGMENT_KINDS:
+        if kind != 'manga' and set(kind_fields).isdisjoint(fields):
+            continue
+        loaded = _load_fragments(kind, kind_fields, rows, prefix)
+        merged = [
+            None if manga is None or fragment is None else {**manga, **fragment}
+            for manga, fragment in zip(merged, loaded)
+        ]
+
+    return [
+        {
+            field: getattr(row, prefix + 'views') if field == 'views' else manga[field]
+            for field in fields
+        } if manga is not None else None
+        for row, manga in zip(rows, merged)
+    ]
+
+
+def bump_manga_versions(condition):
+    """Give the manga matching `condition` a new fragment key.
+
+    Used when a change affects a manga's serialized form without touching
+    its own row, e.g. a new rating or chapter. updated_at is left alone so
+    the "recently updated" order does not change.
+    """
+    db.session.execute(
+        db.update(Manga).where(condition).values(
+            version=Manga.version + 1,
+            updated_at=Manga.updated_at
+        )
+    )
+
+
+def init_fragments(app):
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', 10000)  # serialized entities kept
+    fragments.max_entries = app.config['FRAGMENT_CACHE_SIZE']
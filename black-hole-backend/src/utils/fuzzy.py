@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from src.models.user import db, Manga
+from src.utils.suggest import normalize
+
+FUZZY_FIELDS = ('title', 'arabic_title')
+
+# Minimum trigram similarity for a title to match
+SIMILARITY_THRESHOLD = 0.3
+
+# Weight of the share of query trigrams found in a title, lets a partial
+# query like "kyojn" match "Shingeki no Kyojin" (similar to word_similarity)
+CONTAINMENT_WEIGHT = 0.8
+
+# Titles scored exactly per query, picked by shared trigram count
+CANDIDATE_CAP = 500
+
+
+def trigrams(text):
+    """Character trigrams of every word, padded like pg_trgm ('  ab', 'ab ')"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to manga titles.
+
+    A query only reads the posting lists of its own trigrams, keeps the
+    CANDIDATE_CAP titles sharing the most trigrams and scores those with
+    the Jaccard similarity of the trigram sets, or the weighted share of
+    the query found in the title when that is higher. Admin writes in this
+    process update the index in place, other workers rebuild it when it
+    is older than `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._postings = None  # trigram -> set of (manga_id, field)
+        self._grams = {}  # (manga_id, field) -> trigram set
+        self._built_at = 0
+
+    def _add_locked(self, manga):
+        for field in FUZZY_FIELDS:
+            grams = trigrams(getattr(manga, field))
+            if not grams:
+                continue
+            self._grams[(manga.id, field)] = grams
+            for gram in grams:
+                self._postings[gram].add((manga.id, field))
+
+    def _remove_locked(self, manga_id):
+        for field in FUZZY_FIELDS:
+            for gram in self._grams.pop((manga_id, field), ()):
+                postings = self._postings[gram]
+                postings.discard((manga_id, field))
+                if not postings:
+                    del self._postings[gram]
+
+    def rebuild(self):
+        rows = db.session.execute(
+            db.select(Manga.id, *[getattr(Manga, field) for field in FUZZY_FIELDS])
+        ).all()
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._grams = {}
+            for row in rows:
+                self._add_locked(row)
+            self._built_at = time.monotonic()
+        return len(rows)
+
+    def _ensure_built(self):
+        if self._postings is None or time.monotonic() - self._built_at >= self.ttl:
+            self.rebuild()
+
+    def upsert(self, manga):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove_locked(manga.id)
+            self._add_locked(manga)
+
+    def remove(self, manga_id):
+        with self._lock:
+            if self._postings is not None:
+                self._remove_locked(manga_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def search(self, query, limit=200):
+        """Return [(manga_id, similarity)] best first, at most `limit` manga"""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        self._ensure_built()
+
+        with self._lock:
+            postings = self._postings or {}
+            shared = Counter()
+            for gram in grams:
+                shared.update(postings.get(gram, ()))
+
+            scores = {}
+            for (manga_id, field), count in shared.most_common(CANDIDATE_CAP):
+                similarity = max(
+                    count / (len(grams) + len(self._grams[(manga_id, field)]) - count),
+                    CONTAINMENT_WEIGHT * count / len(grams)
+                )
+                if similarity >= SIMILARITY_THRESHOLD and similarity > scores.get(manga_id, 0):
+                    scores[manga_id] = similarity
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+fuzzy_index = TrigramIndex()
+
+
+def init_fuzzy(app):
+    app.config.setdefault('FUZZY_INDEX_TTL', 300)  # seconds
+    app.config.setdefault('FUZZY_MAX_RESULTS', 200)  # matches passed on to the list query
+    fuzzy_index.ttl = app.config['FUZZY_INDEX_TTL']
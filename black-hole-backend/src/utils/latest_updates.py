@@ -0,0 +1,201 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from src.models.user import db, Manga, Chapter, LatestUpdate
+from src.utils.fields import manga_columns, row_to_dict
+
+# Chapters kept per manga in the feed
+RECENT_CHAPTERS = 3
+
+FEED_MANGA_FIELDS = ('id', 'title', 'arabic_title', 'cover_image', 'status')
+
+
+def encode_cursor(released_at, manga_id):
+    raw = f'{released_at.isoformat()}|{manga_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a feed cursor, raises ValueError when it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        released_at, manga_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(released_at), int(manga_id)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def _chapter_entry(chapter_id, chapter_number, released_at):
+    return {
+        'id': chapter_id,
+        'chapter_number': float(chapter_number),
+        'released_at': released_at.isoformat() if released_at else None
+    }
+
+
+def record_release(chapter):
+    """Put a newly created chapter at the head of its manga's feed row.
+
+    Runs in the caller's transaction so the feed commits with the chapter.
+    """
+    released_at = chapter.created_at or datetime.utcnow()
+    update = db.session.get(LatestUpdate, chapter.manga_id)
+    entry = _chapter_entry(chapter.id, chapter.chapter_number, released_at)
+
+    if update is None:
+        db.session.add(LatestUpdate(
+            manga_id=chapter.manga_id,
+            released_at=released_at,
+            recent_chapters=json.dumps([entry])
+        ))
+    else:
+        chapters = [entry] + json.loads(update.recent_chapters or '[]')
+        update.recent_chapters = json.dumps(chapters[:RECENT_CHAPTERS])
+        update.released_at = released_at
+
+
+def refresh_manga(manga_id, exclude_chapter_id=None):
+    """Recompute one manga's feed row from its chapters, e.g. after a delete"""
+    query = db.select(Chapter.id, Chapter.chapter_number, Chapter.created_at).where(
+        Chapter.manga_id == manga_id
+    )
+    if exclude_chapter_id is not None:
+        query = query.where(Chapter.id != exclude_chapter_id)
+    rows = db.session.execute(
+        query.order_by(Chapter.created_at.desc(), Chapter.id.desc()).limit(RECENT_CHAPTERS)
+    ).all()
+
+    update = db.session.get(LatestUpdate, manga_id)
+    if not rows:
+        if update is not None:
+            db.session.delete(update)
+        return
+
+    chapters = [_chapter_entry(row.id, row.chapter_number, row.created_at) for row in rows]
+    if update is None:
+        update = LatestUpdate(manga_id=manga_id)
+        db.session.add(update)
+    update.released_at = rows[0].created_at
+    update.recent_chapters = json.dumps(chapters)
+
+
+def rebuild():
+    """Rebuild every feed row from the chapter table, returns the row count"""
+    db.session.execute(db.delete(LatestUpdate))
+    manga_ids = db.session.execute(db.select(Chapter.manga_id).distinct()).scalars().all()
+    for manga_id in manga_ids:
+        refresh_manga(manga_id)
+    db.session.commit()
+    return len(manga_ids)
+
+
+def ensure_feed():
+    """Build the feed when it is empty, e.g. for chapters added before it existed"""
+    if db.session.execute(db.select(LatestUpdate.manga_id).limit(1)).first() is not None:
+        return 0
+    return rebuild()
+
+
+def query_feed(limit, cursor=None, manga_id=None):
+    """Read one feed page from the database using keyset pagination"""
+    query = db.select(
+        LatestUpdate.released_at, LatestUpdate.recent_chapters,
+        *manga_columns(FEED_MANGA_FIELDS, prefix='manga_')
+    ).join(Manga, LatestUpdate.manga_id == Manga.id)
+
+    if manga_id is not None:
+        query = query.where(LatestUpdate.manga_id == manga_id)
+
+    if cursor is not None:
+        released_at, last_manga_id = cursor
+        query = query.where(db.or_(
+            LatestUpdate.released_at < released_at,
+            db.and_(LatestUpdate.released_at == released_at, LatestUpdate.manga_id < last_manga_id)
+        ))
+
+    rows = db.session.execute(
+        query.order_by(LatestUpdate.released_at.desc(), LatestUpdate.manga_id.desc()).limit(limit)
+    ).all()
+
+    return [{
+        'manga': row_to_dict(row, FEED_MANGA_FIELDS, prefix='manga_'),
+        'chapters': json.loads(row.recent_chapters or '[]'),
+        'released_at': row.released_at.isoformat()
+    } for row in rows]
+
+
+def next_cursor(items, limit):
+    if len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(datetime.fromisoformat(last['released_at']), last['manga']['id'])
+
+
+class FirstPageBuffer:
+    """Keeps the first feed page in memory so the homepage skips the database.
+
+    Releases made in this process update the buffer immediately. Other
+    workers pick them up when the buffer expires after `ttl` seconds.
+    """
+
+    def __init__(self, size=20, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = None
+        self._loaded_at = 0
+
+    def get(self, limit):
+        with self._lock:
+            if self._items is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._items[:limit]
+
+        items = query_feed(self.size)
+        with self._lock:
+            self._items = items
+            self._loaded_at = time.monotonic()
+        return items[:limit]
+
+    def push(self, item):
+        """Move a manga to the front after a release committed"""
+        with self._lock:
+            if self._items is None:
+                return
+            items = [entry for entry in self._items if entry['manga']['id'] != item['manga']['id']]
+            self._items = ([item] + items)[:self.size]
+
+    def invalidate(self):
+        with self._lock:
+            self._items = None
+
+
+first_page = FirstPageBuffer()
+
+
+def publish_release(manga_id):
+    """Refresh the in-memory first page with the manga's committed feed row"""
+    items = query_feed(1, manga_id=manga_id)
+    if items:
+        first_page.push(items[0])
+    else:
+        first_page.invalidate()
+
+
+def get_page(limit, cursor=None):
+    if cursor is None and limit <= first_page.size:
+        return first_page.get(limit)
+    return query_feed(limit, cursor)
+
+
+def init_latest_updates(app):
+    app.config.setdefault('LATEST_UPDATES_BUFFER_SIZE', 20)
+    app.config.setdefault('LATEST_UPDATES_BUFFER_TTL', 30)  # seconds
+    first_page.size = app.config['LATEST_UPDATES_BUFFER_SIZE']
+    first_page.ttl = app.config['LATEST_UPDATES_BUFFER_TTL']
+
+    @app.cli.command('rebuild-latest-updates')
+    def rebuild_latest_updates_command():
+        """Rebuild the latest updates feed from the chapter table."""
+        print(f'Rebuilt latest updates for {rebuild()} manga')
@@ -0,0 +1,273 @@
+import json
+import os
+import time
+from urllib.parse import unquote, urlsplit
+import click
+from src.models.user import db, User, Manga, Chapter, Comment, MaintenanceRun
+from src.utils.scheduler import scheduler, claim_run
+
+STORAGE_JOB = 'storage-gc'
+DATABASE_JOB = 'db-maintenance'
+
+# Columns that refer to upload files, and whether they hold a JSON list
+UPLOAD_REFERENCES = (
+    (User.profile_image, False),
+    (Manga.cover_image, False),
+    (Chapter.images, True),
+    (Comment.images, True),
+)
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def upload_key(reference):
+    """Path of a referenced upload relative to the upload folder, or None.
+
+    '/static/uploads/manga/a.jpg' and 'manga/a.jpg' both give
+    'manga/a.jpg' and bare file names are kept as they are. Paths are
+    percent-decoded to match the names on disk. Absolute URLs give the
+    part after 'uploads/' whatever their host, since the app's own host
+    is not known here, and None when they have no such part.
+    """
+    if not isinstance(reference, str) or not reference.strip():
+        return None
+    parts = urlsplit(reference.strip())
+    path = unquote(parts.path)
+    if 'uploads/' in path:
+        return path.split('uploads/', 1)[1] or None
+    if parts.netloc:
+        return None
+    return path.lstrip('/') or None
+
+
+def _references(value, is_list):
+    if not is_list:
+        return (value,)
+    try:
+        items = json.loads(value)
+    except ValueError:
+        return (value,)
+    return items if isinstance(items, list) else (items,)
+
+
+def referenced_uploads(batch_size=1000):
+    """Return the keys of every upload the database refers to.
+
+    Each column is streamed `batch_size` rows at a time, so memory grows
+    with the number of referenced files, not with the tables.
+    """
+    keys = set()
+    for column, is_list in UPLOAD_REFERENCES:
+        result = db.session.execute(
+            db.select(column).where(column.isnot(None)).execution_options(yield_per=batch_size)
+        )
+        for value in result.scalars():
+            for reference in _references(value, is_list):
+                key = upload_key(reference)
+                if key:
+                    keys.add(key)
+    return keys
+
+
+def _upload_files(folder):
+    """Yield the files below `folder` while walking it, as os.DirEntry"""
+    try:
+        entries = os.scandir(folder)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue  # .gitkeep and temporary files
+            if entry.is_dir(follow_symlinks=False):
+                yield from _upload_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def collect_uploads(upload_folder, grace, dry_run=False, batch_size=1000):
+    """Delete the upload files no row refers to, returns a report.
+
+    Files changed in the last `grace` seconds are kept, an upload is
+    written before the row referring to it is committed. The cutoff is
+    taken before the reference scan, so files created while it runs are
+    never candidates. Bare file names (e.g. the default avatar) protect
+    files of that name in every folder.
+    """
+    started = time.monotonic()
+    cutoff = time.time() - grace
+    referenced = referenced_uploads(batch_size)
+    report = {'scanned': 0, 'kept_recent': 0, 'removed': 0, 'bytes_reclaimed': 0, 'errors': 0, 'dry_run': dry_run}
+
+    for entry in _upload_files(upload_folder):
+        report['scanned'] += 1
+        key = os.path.relpath(entry.path, upload_folder).replace(os.sep, '/')
+        if key in referenced or entry.name in referenced:
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                report['kept_recent'] += 1
+                continue
+            if not dry_run:
+                os.remove(entry.path)
+        except OSError:
+            report['errors'] += 1
+            continue
+        report['removed'] += 1
+        report['bytes_reclaimed'] += stat.st_size
+
+    report['duration'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def maintain_database(analysis_limit=1000, vacuum_pages=0):
+    """Refresh the planner statistics and return free pages to the file system.
+
+    SQLite gets an ANALYZE sampling at most `analysis_limit` rows per
+    index (0 reads them all), PRAGMA optimize, and an incremental vacuum
+    of up to `vacuum_pages` free pages (0 frees all of them). The vacuum
+    needs auto_vacuum=INCREMENTAL, see `flask vacuum-db`. PostgreSQL only
+    gets ANALYZE, its autovacuum daemon reclaims the space.
+    """
+    started = time.monotonic()
+    engine = db.engine
+    report = {'backend': engine.dialect.name, 'bytes_reclaimed': 0}
+
+    with engine.connect() as connection:
+        if engine.dialect.name != 'sqlite':
+            connection.exec_driver_sql('ANALYZE')
+            connection.commit()
+        else:
+            def pragma(name):
+                return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+            page_size, free_before, mode = pragma('page_size'), pragma('freelist_count'), pragma('auto_vacuum')
+            if mode == 2:
+                # executescript steps the pragma to the end, execute() frees a single page
+                connection.connection.driver_connection.executescript(
+                    f'PRAGMA incremental_vacuum({int(vacuum_pages)});'
+                )
+            connection.exec_driver_sql(f'PRAGMA analysis_limit={int(analysis_limit)}')
+            connection.exec_driver_sql('ANALYZE')
+            connection.exec_driver_sql('PRAGMA optimize')
+            connection.exec_driver_sql('PRAGMA analysis_limit=0')
+            connection.commit()
+
+            free_after = pragma('freelist_count')
+            report.update({
+                'auto_vacuum': AUTO_VACUUM_MODES.get(mode, mode),
+                'pages_freed': max(free_before - free_after, 0),
+                'free_pages': free_after,
+                'bytes_reclaimed': max(free_before - free_after, 0) * page_size,
+            })
+
+    report['duration'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def set_incremental_vacuum(rewrite=False):
+    """Switch a SQLite database to auto_vacuum=INCREMENTAL.
+
+    The mode only applies to databases without tables, unless `rewrite`
+    runs a VACUUM, which rebuilds the whole file and blocks writers until
+    it is done. Returns the database size in bytes before and after, or
+    None for other backends.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return None
+
+    with engine.connect() as connection:
+        def size():
+            return connection.exec_driver_sql('PRAGMA page_count').scalar() * \
+                connection.exec_driver_sql('PRAGMA page_size').scalar()
+
+        before = size()
+        connection.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        if rewrite:
+            connection.exec_driver_sql('VACUUM')
+        connection.commit()
+        return before, size()
+
+
+def record_run(job, report, keep=100):
+    """Store the report of a run and drop all but the `keep` latest ones"""
+    db.session.add(MaintenanceRun(
+        job=job,
+        duration=report['duration'],
+        bytes_reclaimed=report['bytes_reclaimed'],
+        details=json.dumps(report)
+    ))
+    db.session.flush()
+    latest = db.select(MaintenanceRun.id).order_by(MaintenanceRun.id.desc()).limit(keep)
+    db.session.execute(db.delete(MaintenanceRun).where(MaintenanceRun.id.not_in(latest)))
+    db.session.commit()
+
+
+def recent_runs(limit=20, job=None):
+    query = MaintenanceRun.query.order_by(MaintenanceRun.id.desc())
+    if job:
+        query = query.filter_by(job=job)
+    return query.limit(limit).all()
+
+
+def init_maintenance(app):
+    app.config.setdefault('STORAGE_GC_INTERVAL', 0)  # seconds between upload scans, 0 disables them
+    app.config.setdefault('STORAGE_GC_GRACE', 86400)  # seconds an unreferenced upload is kept
+    app.config.setdefault('DB_MAINTENANCE_INTERVAL', 86400)  # seconds between ANALYZE/vacuum runs, 0 disables them
+    app.config.setdefault('DB_ANALYSIS_LIMIT', 1000)  # rows ANALYZE samples per index, 0 reads them all
+    app.config.setdefault('DB_VACUUM_PAGES', 0)  # free pages returned per run, 0 returns all of them
+    app.config.setdefault('MAINTENANCE_RUNS_KEPT', 100)  # run reports kept in the database
+
+    def run_storage_gc(dry_run=False):
+        report = collect_uploads(app.config['UPLOAD_FOLDER'], app.config['STORAGE_GC_GRACE'], dry_run)
+        if not dry_run:
+            record_run(STORAGE_JOB, report, app.config['MAINTENANCE_RUNS_KEPT'])
+        app.logger.info('Storage GC removed %d files, %d bytes in %.2fs',
+                        report['removed'], report['bytes_reclaimed'], report['duration'])
+        return report
+
+    def run_database_maintenance():
+        report = maintain_database(app.config['DB_ANALYSIS_LIMIT'], app.config['DB_VACUUM_PAGES'])
+        record_run(DATABASE_JOB, report, app.config['MAINTENANCE_RUNS_KEPT'])
+        app.logger.info('Database maintenance reclaimed %d bytes in %.2fs',
+                        report['bytes_reclaimed'], report['duration'])
+        return report
+
+    storage_interval = app.config['STORAGE_GC_INTERVAL']
+    if storage_interval:
+        scheduler.add_job(STORAGE_JOB, storage_interval,
+                          lambda: claim_run(STORAGE_JOB, storage_interval) and run_storage_gc())
+    database_interval = app.config['DB_MAINTENANCE_INTERVAL']
+    if database_interval:
+        scheduler.add_job(DATABASE_JOB, database_interval,
+                          lambda: claim_run(DATABASE_JOB, database_interval) and run_database_maintenance())
+
+    @app.cli.command('gc-uploads')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be removed')
+    def gc_uploads_command(dry_run):
+        """Remove upload files no row refers to."""
+        report = run_storage_gc(dry_run)
+        action = 'Would remove' if dry_run else 'Removed'
+        print(f'{action} {report["removed"]} of {report["scanned"]} files, {report["bytes_reclaimed"]} bytes '
+              f'in {report["duration"]}s ({report["kept_recent"]} unreferenced files are in the grace period)')
+
+    @app.cli.command('maintain-db')
+    def maintain_db_command():
+        """Refresh planner statistics and run an incremental vacuum."""
+        report = run_database_maintenance()
+        print(f'Reclaimed {report["bytes_reclaimed"]} bytes in {report["duration"]}s')
+        if report.get('auto_vacuum') == 'none':
+            print('auto_vacuum is off, run `flask vacuum-db` once to enable incremental vacuums')
+
+    @app.cli.command('vacuum-db')
+    @click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+    def vacuum_db_command(yes):
+        """Rebuild the SQLite database with auto_vacuum=INCREMENTAL."""
+        if not yes:
+            click.confirm('VACUUM blocks writers until the whole file is rewritten, continue?', abort=True)
+        sizes = set_incremental_vacuum(rewrite=True)
+        if sizes is None:
+            raise click.ClickException('Only SQLite databases are vacuumed by this command')
+        print(f'Database rebuilt, {sizes[0]} -> {sizes[1]} bytes')
@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from src.models.user import db, Chapter, Favorite, Notification, NotificationCounter
+
+# Favorites handled per transaction, keeps each write lock short
+FAN_OUT_CHUNK_SIZE = 5000
+
+# A single worker keeps fan-outs ordered and off the request threads
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+
+
+def _bump_counters(user_ids):
+    """Add one unread notification for every user selected by `user_ids`"""
+    missing = db.select(user_ids.c.user_id, db.literal(0)).where(
+        ~db.exists().where(NotificationCounter.user_id == user_ids.c.user_id)
+    )
+    db.session.execute(
+        db.insert(NotificationCounter).from_select(['user_id', 'unread'], missing)
+    )
+    db.session.execute(
+        db.update(NotificationCounter)
+        .where(NotificationCounter.user_id.in_(db.select(user_ids.c.user_id)))
+        .values(unread=NotificationCounter.unread + 1)
+    )
+
+
+def fan_out_new_chapter(chapter_id):
+    """Notify everyone who favorited the chapter's manga, returns the count.
+
+    Followers are processed in id ranges of FAN_OUT_CHUNK_SIZE, each with
+    one INSERT ... SELECT for the notifications and two set based
+    statements for the unread counters, committed separately.
+    """
+    chapter = db.session.get(Chapter, chapter_id)
+    if not chapter:
+        return 0
+
+    created_at = datetime.utcnow()
+    last_id = 0
+    total = 0
+
+    while True:
+        # Upper favorite id of this chunk, None once fewer rows remain
+        bound = db.session.execute(
+            db.select(Favorite.id)
+            .where(Favorite.manga_id == chapter.manga_id, Favorite.id > last_id)
+            .order_by(Favorite.id)
+            .offset(FAN_OUT_CHUNK_SIZE - 1)
+            .limit(1)
+        ).scalar()
+
+        condition = [Favorite.manga_id == chapter.manga_id, Favorite.id > last_id]
+        if bound is not None:
+            condition.append(Favorite.id <= bound)
+
+        followers = db.select(
+            Favorite.user_id,
+            db.literal(chapter.manga_id),
+            db.literal(chapter.id),
+            db.literal('chapter'),
+            db.literal(False),
+            db.literal(created_at)
+        ).where(*condition)
+
+        result = db.session.execute(
+            db.insert(Notification).from_select(
+                ['user_id', 'manga_id', 'chapter_id', 'kind', 'is_read', 'created_at'],
+                followers
+            )
+        )
+        _bump_counters(db.select(Favorite.user_id).where(*condition).subquery())
+        db.session.commit()
+
+        total += result.rowcount
+        if bound is None:
+            return total
+        last_id = bound
+
+
+def _run_fan_out(app, chapter_id):
+    with app.app_context():
+        try:
+            fan_out_new_chapter(chapter_id)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Notification fan-out failed for chapter %s', chapter_id)
+
+
+def schedule_new_chapter_notifications(chapter_id):
+    """Queue the fan-out for a committed chapter and return immediately"""
+    app = current_app._get_current_object()
+    if app.config.get('NOTIFICATIONS_SYNC'):
+        fan_out_new_chapter(chapter_id)
+    else:
+        _executor.submit(_run_fan_out, app, chapter_id)
+
+
+def remove_notifications(condition):
+    """Delete the notifications matching `condition` and fix unread counters"""
+    unread = db.and_(condition, Notification.is_read.is_(False))
+    unread_per_user = db.select(db.func.count(Notification.id)).where(
+        unread, Notification.user_id == NotificationCounter.user_id
+    ).scalar_subquery()
+
+    db.session.execute(
+        db.update(NotificationCounter)
+        .where(NotificationCounter.user_id.in_(db.select(Notification.user_id).where(unread)))
+        .values(unread=NotificationCounter.unread - unread_per_user)
+    )
+    db.session.execute(db.delete(Notification).where(condition))
+
+
+def unread_count(user_id):
+    counter = db.session.get(NotificationCounter, user_id)
+    return counter.unread if counter else 0
+
+
+def mark_read(user_id, notification_id=None):
+    """Mark one notification, or all of them, as read for the user"""
+    query = db.update(Notification).where(
+        Notification.user_id == user_id, Notification.is_read.is_(False)
+    )
+    if notification_id is not None:
+        query = query.where(Notification.id == notification_id)
+
+    changed = db.session.execute(query.values(is_read=True)).rowcount
+    if changed:
+        db.session.execute(
+            db.update(NotificationCounter)
+            .where(NotificationCounter.user_id == user_id)
+            .values(unread=db.case(
+                (NotificationCounter.unread > changed, NotificationCounter.unread - changed),
+                else_=0
+            ))
+        )
+    return changed
@@ -0,0 +1,12 @@
+from flask import current_app, request
+
+
+def pagination_args(default_per_page=20):
+    """Read `page` and `per_page` from the query string.
+
+    `per_page` is clamped to MAX_PER_PAGE so a client cannot ask for the
+    whole table in one request.
+    """
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = request.args.get('per_page', default_per_page, type=int) or default_per_page
+    return page, min(max(per_page, 1), current_app.config.get('MAX_PER_PAGE', 100))
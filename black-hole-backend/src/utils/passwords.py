@@ -0,0 +1,96 @@
+import threading
+import time
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PasswordHashBusy(Exception):
+    """No hashing slot became free within the queue timeout"""
+
+
+def normalize_method(method):
+    """Expand a Werkzeug method spec to the form stored in hashes.
+
+    'scrypt' -> 'scrypt:32768:8:1', 'pbkdf2' -> 'pbkdf2:sha256:<default iterations>'
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Unsupported password hash method {method!r}')
+
+
+class PasswordHasher:
+    """Bounds how many password hashes run at once.
+
+    At most `workers` hashes run at a time, on the request threads that
+    asked for them, so a burst of logins uses at most that many cores while
+    catalog reads keep the rest (hashlib releases the GIL during scrypt and
+    pbkdf2). A request waits up to `queue_timeout` seconds for a free slot
+    and gets PasswordHashBusy after that. With workers=0 there is no limit.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=2, queue_timeout=5.0):
+        self.configure(method, workers, queue_timeout)
+
+    def configure(self, method, workers, queue_timeout):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(workers) if workers else None
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _run(self, func, *args, **kwargs):
+        if self._slots is None:
+            return func(*args, **kwargs)
+
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise PasswordHashBusy()
+        self.wait_seconds += time.perf_counter() - started
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._slots.release()
+            self.completed += 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with other KDF parameters than the configured ones"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        return {
+            'method': self.method.split(':', 1)[0],
+            'workers': self.workers,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(self.wait_seconds / self.completed * 1000, 2) if self.completed else 0
+        }
+
+
+hasher = PasswordHasher()
+
+
+def init_passwords(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)  # any Werkzeug method spec
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)  # concurrent hashes per process, 0 does not limit them
+    app.config.setdefault('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0)  # seconds to wait for a slot
+    hasher.configure(
+        app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+    )
@@ -0,0 +1,89 @@
+import threading
+from flask import current_app, request
+from sqlalchemy import event
+
+
+def query_budget(limit):
+    """Declare the most SQL statements one call of the view may issue.
+
+    Checked by benchmarks/query_budget.py against a seeded database, and
+    at runtime when QUERY_BUDGET_WARN is on. Put it right below the route
+    decorator; functools.wraps carries the attribute through the others.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryCounter:
+    """Records the statements sent to the database by the current thread.
+
+    Listens on every engine of the app (primary and binds) while enabled,
+    so statements issued by views, lazy loads and flushes are all counted.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._engines = set()
+
+    def attach(self, engine):
+        if engine not in self._engines:
+            event.listen(engine, 'before_cursor_execute', self._record)
+            self._engines.add(engine)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        statements = getattr(self._local, 'statements', None)
+        if statements is not None:
+            statements.append((statement, parameters))
+
+    def start(self):
+        self._local.statements = []
+
+    def stop(self):
+        """Stop recording, returns the recorded (statement, parameters) pairs"""
+        statements = getattr(self._local, 'statements', None) or []
+        self._local.statements = None
+        return statements
+
+
+counter = QueryCounter()
+
+
+def format_statements(statements):
+    return '\n'.join(
+        f'  {number}. {" ".join(statement.split())}  {parameters!r}'
+        for number, (statement, parameters) in enumerate(statements, 1)
+    )
+
+
+def start_counting():
+    counter.start()
+
+
+def check_budget(response):
+    statements = counter.stop()
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, 'query_budget', None)
+    if limit is not None and len(statements) > limit:
+        current_app.logger.warning(
+            '%s issued %d SQL statements, budget is %d:\n%s',
+            request.endpoint, len(statements), limit, format_statements(statements)
+        )
+    return response
+
+
+def init_query_budget(app):
+    app.config.setdefault('QUERY_BUDGET_WARN', False)  # log requests that exceed their budget
+    if not app.config['QUERY_BUDGET_WARN']:
+        return
+
+    from src.models.user import db
+
+    @app.before_request
+    def attach_engines():
+        for engine in db.engines.values():
+            counter.attach(engine)
+        start_counting()
+
+    app.after_request(check_budget)
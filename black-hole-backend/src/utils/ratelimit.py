@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Per endpoint limits, 'ip' applies per client address and 'user' per
+# account (the signed in user, or the email being tried for logins)
+DEFAULT_LIMITS = {
+    'login': {'ip': '20/minute', 'user': '5/minute'},
+    'register': {'ip': '5/minute'},
+    'verify': {'ip': '10/minute', 'user': '5/minute'},
+    'resend_verification': {'ip': '5/minute', 'user': '3/hour'},
+    'admin_login': {'ip': '5/minute'},
+    'comment': {'ip': '30/minute', 'user': '10/minute'},
+    'rate': {'ip': '60/minute', 'user': '30/minute'},
+}
+
+
+def parse_limit(value):
+    """Parse '10/minute' into (capacity, tokens per second)"""
+    count, period = value.split('/')
+    count = int(count)
+    return count, count / PERIODS[period.strip().rstrip('s')]
+
+
+class MemoryStore:
+    """Token buckets kept in this process.
+
+    Any object with the same `consume` method can replace it through
+    RATELIMIT_STORE, e.g. one backed by a shared cache so every worker
+    sees the same buckets.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Take `cost` tokens from the bucket.
+
+        Returns (allowed, tokens left, seconds until `cost` tokens are
+        available again, seconds until the bucket is full).
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            reset = (capacity - tokens) / rate
+            self._buckets[key] = (tokens, now, now + reset)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, int(tokens), max(cost - tokens, 0) / rate, reset
+
+    def _prune(self, now):
+        # A bucket that refilled completely behaves exactly like a missing one
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+
+
+class RateLimiter:
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.limits = {}
+
+    def configure(self, limits, store=None):
+        self.limits = {
+            name: {scope: parse_limit(value) for scope, value in scopes.items()}
+            for name, scopes in limits.items()
+        }
+        if store is not None:
+            self.store = store
+
+    def check(self, name, user_key=None):
+        """Consume one token from each applicable bucket.
+
+        Returns (allowed, headers) for the tightest bucket.
+        """
+        result = None
+        for scope, (capacity, rate) in self.limits.get(name, {}).items():
+            if scope == 'ip':
+                key = f'{name}:ip:{request.remote_addr}'
+            elif user_key:
+                key = f'{name}:user:{user_key}'
+            else:
+                continue
+            allowed, remaining, retry_after, reset = self.store.consume(key, capacity, rate)
+            if result is None or not allowed or remaining < result[2]:
+                result = (allowed, capacity, remaining, retry_after, reset)
+            if not allowed:
+                break
+
+        if result is None:
+            return True, {}
+        allowed, capacity, remaining, retry_after, reset = result
+        headers = {
+            'RateLimit-Limit': str(capacity),
+            'RateLimit-Remaining': str(remaining),
+            'RateLimit-Reset': str(math.ceil(reset))
+        }
+        if not allowed:
+            headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+        return allowed, headers
+
+
+limiter = RateLimiter()
+
+
+def jwt_user():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def json_field(field):
+    """User key taken from a field of the JSON body, e.g. the email being tried"""
+    def user_key():
+        value = (request.get_json(silent=True) or {}).get(field)
+        return str(value).strip().lower() if value else None
+    return user_key
+
+
+def rate_limit(name, user_key=jwt_user):
+    """Reject the view with 429 once a bucket for `name` is empty.
+
+    Put it below @jwt_required() so the signed in user is known.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('RATELIMIT_ENABLED', True):
+                return view(*args, **kwargs)
+
+            allowed, headers = limiter.check(name, user_key())
+            if not allowed:
+                response = jsonify({'error': 'عدد الطلبات كبير جداً، يرجى المحاولة لاحقاً'})
+                response.status_code = 429
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
+
+
+def init_ratelimit(app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMITS', DEFAULT_LIMITS)
+    app.config.setdefault('RATELIMIT_STORE', None)  # object with consume(), defaults to MemoryStore
+    app.config.setdefault('PROXY_FIX_X_FOR', 0)  # trusted proxies in front of the app, 0 uses the socket address
+    limiter.configure(app.config['RATELIMITS'], app.config['RATELIMIT_STORE'])
+
+    # Behind a proxy every request comes from the proxy's address, which
+    # would put all clients in one per-IP bucket. Only trust as many
+    # X-Forwarded-For entries as there are proxies, clients can forge more.
+    hops = app.config['PROXY_FIX_X_FOR']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
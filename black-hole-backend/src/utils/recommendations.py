@@ -0,0 +1,243 @@
+from datetime import datetime
+from importlib.util import find_spec
+import click
+from src.models.user import db, Manga, Favorite, Rating, ReadingProgress, SimilarManga, JobState, manga_tag
+from src.utils.fields import manga_columns, row_to_dict
+from src.utils.scheduler import scheduler, claim_run
+
+# numpy and scipy are only needed to build the table and are imported on
+# first use, serving works without them and startup does not pay for them
+np = None
+sparse = None
+
+# Interaction weights in the user x manga matrix
+FAVORITE_WEIGHT = 3.0
+RATING_WEIGHT = 2.0  # scaled by rating / 5
+PROGRESS_WEIGHT = 1.0
+
+# Share of the final score coming from genre overlap
+GENRE_WEIGHT = 0.2
+
+TOP_K = 12
+BLOCK_SIZE = 256
+REFRESH_JOB = 'similar-refresh'
+# Claimed separately, REFRESH_JOB's last run is the watermark of incremental rebuilds
+REFRESH_CLAIM = 'similar-refresh-claim'
+
+SIMILAR_MANGA_FIELDS = ('id', 'title', 'arabic_title', 'cover_image', 'status')
+
+
+def numpy_available():
+    return find_spec('numpy') is not None and find_spec('scipy') is not None
+
+
+def require_numpy():
+    global np, sparse
+    if np is None:
+        try:
+            import numpy
+            from scipy import sparse as scipy_sparse
+        except ImportError:
+            raise click.ClickException('numpy and scipy are required to build recommendations')
+        np, sparse = numpy, scipy_sparse
+
+
+def _read_column_pairs(statement):
+    """Read a two or three column result into numpy arrays in chunks"""
+    rows = db.session.execute(statement.execution_options(yield_per=50000))
+    chunks = [np.array(chunk, dtype=np.float64) for chunk in rows.partitions()]
+    if not chunks:
+        return np.empty((0, len(statement.selected_columns)))
+    return np.concatenate(chunks)
+
+
+def load_interactions(item_index):
+    """Build the L2 column normalised users x manga interaction matrix"""
+    parts = [
+        (db.select(Favorite.user_id, Favorite.manga_id, db.literal(FAVORITE_WEIGHT)), 1.0),
+        (db.select(Rating.user_id, Rating.manga_id, Rating.rating / 5.0).where(Rating.manga_id.isnot(None)), RATING_WEIGHT),
+        (db.select(ReadingProgress.user_id, ReadingProgress.manga_id, db.literal(PROGRESS_WEIGHT)), 1.0),
+    ]
+    arrays = []
+    for statement, scale in parts:
+        data = _read_column_pairs(statement)
+        if len(data):
+            data[:, 2] *= scale
+            arrays.append(data)
+
+    if not arrays:
+        return sparse.csr_matrix((0, len(item_index)))
+
+    data = np.concatenate(arrays)
+    # Drop interactions with manga that no longer exist
+    columns = np.searchsorted(item_index, data[:, 1])
+    columns = np.clip(columns, 0, len(item_index) - 1)
+    known = item_index[columns] == data[:, 1]
+    data, columns = data[known], columns[known]
+
+    _, rows = np.unique(data[:, 0], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (data[:, 2].astype(np.float32), (rows, columns)),
+        shape=(rows.max() + 1 if len(rows) else 0, len(item_index))
+    )
+    return _normalize_columns(matrix)
+
+
+def load_genres(item_index):
+    """Build the L2 row normalised manga x genre matrix from the tag table"""
+    genre_ids = {}
+    rows, columns = [], []
+    position = {manga_id: i for i, manga_id in enumerate(item_index.tolist())}
+
+    for manga_id, tag_id in db.session.execute(db.select(manga_tag.c.manga_id, manga_tag.c.tag_id)):
+        if manga_id in position:
+            rows.append(position[manga_id])
+            columns.append(genre_ids.setdefault(tag_id, len(genre_ids)))
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(item_index), max(len(genre_ids), 1))
+    )
+    return _normalize_rows(matrix)
+
+
+def _normalize_columns(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return (matrix @ sparse.diags(1 / norms)).tocsr()
+
+
+def _normalize_rows(matrix):
+    return _normalize_columns(matrix.T.tocsr()).T.tocsr()
+
+
+def compute_neighbors(interactions, genres, items):
+    """Yield (item position, neighbor positions, scores) for the given items.
+
+    Similarities are computed one block of items at a time as sparse
+    matrix products, so memory stays at BLOCK_SIZE x catalog size.
+    """
+    item_columns = interactions.T.tocsr()
+    for start in range(0, len(items), BLOCK_SIZE):
+        block = items[start:start + BLOCK_SIZE]
+        scores = (item_columns[block] @ interactions).toarray() * (1 - GENRE_WEIGHT)
+        scores += (genres[block] @ genres.T).toarray() * GENRE_WEIGHT
+
+        # Never recommend a manga for itself
+        scores[np.arange(len(block)), block] = 0
+
+        k = min(TOP_K, scores.shape[1] - 1)
+        if k <= 0:
+            continue
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        for row, item in enumerate(block):
+            neighbors = top[row][np.argsort(-scores[row, top[row]])]
+            neighbors = neighbors[scores[row, neighbors] > 0]
+            yield item, neighbors, scores[row, neighbors]
+
+
+def store_neighbors(item_index, results):
+    """Replace the stored neighbors of every item in `results`.
+
+    Commits every BLOCK_SIZE items so writers are never blocked for long.
+    """
+    count = 0
+    for item, neighbors, scores in results:
+        manga_id = int(item_index[item])
+        db.session.execute(db.delete(SimilarManga).where(SimilarManga.manga_id == manga_id))
+        rows = [{
+            'manga_id': manga_id,
+            'rank': rank,
+            'similar_id': int(item_index[neighbor]),
+            'score': float(score)
+        } for rank, (neighbor, score) in enumerate(zip(neighbors, scores))]
+        if rows:
+            db.session.execute(db.insert(SimilarManga), rows)
+        count += 1
+        if count % BLOCK_SIZE == 0:
+            db.session.commit()
+    db.session.commit()
+    return count
+
+
+def changed_manga_since(moment):
+    """Manga whose favorites, ratings or reading progress changed after `moment`"""
+    statements = [
+        db.select(Favorite.manga_id).where(Favorite.created_at >= moment),
+        db.select(Rating.manga_id).where(Rating.updated_at >= moment, Rating.manga_id.isnot(None)),
+        db.select(ReadingProgress.manga_id).where(ReadingProgress.updated_at >= moment),
+        db.select(Manga.id).where(Manga.updated_at >= moment),
+    ]
+    return set(db.session.execute(db.union(*statements)).scalars())
+
+
+def rebuild_similar(incremental=False):
+    """Recompute the neighbor table, only for changed manga when incremental"""
+    require_numpy()
+
+    started_at = datetime.utcnow()
+    item_index = np.array(
+        db.session.execute(db.select(Manga.id).order_by(Manga.id)).scalars().all(),
+        dtype=np.int64
+    )
+    if not len(item_index):
+        return 0
+
+    items = np.arange(len(item_index))
+    state = db.session.get(JobState, REFRESH_JOB)
+    if incremental and state is not None:
+        changed = changed_manga_since(state.last_run_at)
+        if not changed:
+            return 0
+        items = np.flatnonzero(np.isin(item_index, list(changed)))
+    else:
+        # Rows of deleted manga are only cleaned up by full rebuilds
+        db.session.execute(
+            db.delete(SimilarManga).where(SimilarManga.manga_id.not_in(db.select(Manga.id)))
+        )
+
+    interactions = load_interactions(item_index)
+    genres = load_genres(item_index)
+    count = store_neighbors(item_index, compute_neighbors(interactions, genres, items))
+
+    if state is None:
+        db.session.add(JobState(name=REFRESH_JOB, last_run_at=started_at))
+    else:
+        state.last_run_at = started_at
+    db.session.commit()
+    return count
+
+
+def get_similar(manga_id):
+    """Serve the stored neighbors with one indexed lookup"""
+    rows = db.session.execute(
+        db.select(SimilarManga.score, *manga_columns(SIMILAR_MANGA_FIELDS, prefix='manga_'))
+        .join(Manga, SimilarManga.similar_id == Manga.id)
+        .where(SimilarManga.manga_id == manga_id)
+        .order_by(SimilarManga.rank)
+    ).all()
+    return [
+        dict(row_to_dict(row, SIMILAR_MANGA_FIELDS, prefix='manga_'), score=row.score)
+        for row in rows
+    ]
+
+
+def init_recommendations(app):
+    app.config.setdefault('SIMILAR_REFRESH_INTERVAL', 3600)  # seconds, 0 disables
+
+    interval = app.config['SIMILAR_REFRESH_INTERVAL']
+    if interval and numpy_available():
+        # One process per interval rebuilds, the others would redo the same matrices
+        scheduler.add_job(REFRESH_JOB, interval,
+                          lambda: claim_run(REFRESH_CLAIM, interval) and rebuild_similar(incremental=True))
+    elif interval:
+        app.logger.warning(
+            'numpy and scipy are not installed, similar manga will not be refreshed; '
+            'install requirements.txt or set SIMILAR_REFRESH_INTERVAL = 0'
+        )
+
+    @app.cli.command('rebuild-similar')
+    @click.option('--incremental', is_flag=True, help='Only refresh manga with new activity.')
+    def rebuild_similar_command(incremental):
+        """Recompute the similar manga table."""
+        print(f'Updated similar manga for {rebuild_similar(incremental)} titles')
@@ -0,0 +1,135 @@
+import threading
+import time
+from datetime import datetime
+import click
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from src.utils.backup import copy_sqlite
+
+REPLICA_BIND = 'replica'
+HEARTBEAT_JOB = 'replica-heartbeat'
+
+# Set on responses to writes, reads carrying it go to the primary
+STICKY_COOKIE = 'read_primary'
+
+
+class ReplicaHealth:
+    """Tracks whether the replica is close enough to the primary to serve reads.
+
+    The primary's heartbeat row (written by the scheduler) is read back from
+    the replica at most every `check_interval` seconds. Its age is the lag.
+    A replica that lags more than `max_lag` seconds or fails the check is
+    skipped until the next check.
+    """
+
+    def __init__(self, max_lag=10, check_interval=5, heartbeat_interval=5, sticky_seconds=5):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.sticky_seconds = sticky_seconds
+        self.lag = None
+        self._healthy = False
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _measure_lag(self, engine):
+        # Imported here, the models module imports this one for RoutingSession
+        from src.models.user import JobState
+
+        with engine.connect() as connection:
+            last_beat = connection.execute(
+                select(JobState.last_run_at).where(JobState.name == HEARTBEAT_JOB)
+            ).scalar()
+        if last_beat is None:
+            return None
+        # The heartbeat itself is only written every heartbeat_interval seconds
+        return max((datetime.utcnow() - last_beat).total_seconds() - self.heartbeat_interval, 0)
+
+    def healthy(self, engine):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._healthy
+
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                try:
+                    self.lag = self._measure_lag(engine)
+                    self._healthy = self.lag is not None and self.lag <= self.max_lag
+                except SQLAlchemyError:
+                    self.lag = None
+                    self._healthy = False
+                self._checked_at = now
+        return self._healthy
+
+
+health = ReplicaHealth()
+
+
+def read_from_replica():
+    """Route the rest of this request's reads to the replica when it is usable"""
+    if request.method == 'GET' and not request.cookies.get(STICKY_COOKIE):
+        g.read_replica = True
+
+
+def use_primary():
+    """Send the rest of this request to the primary, e.g. before a read-modify-write"""
+    if has_request_context():
+        g.read_replica = False
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind when the request allows it.
+
+    Anything that writes (flushes, pending objects, DML statements) and
+    everything after the first write in a request goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('read_replica'):
+            writing = self._flushing or not self._is_clean() or getattr(clause, 'is_dml', False)
+            engine = self._db.engines.get(REPLICA_BIND)
+            if writing:
+                g.read_replica = False
+            elif engine is not None and health.healthy(engine):
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def mark_writes(response):
+    """Keep the client on the primary for a moment after it wrote something"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        response.set_cookie(STICKY_COOKIE, '1', max_age=health.sticky_seconds, httponly=True, samesite='Lax')
+    return response
+
+
+def init_replica(app):
+    app.config.setdefault('REPLICA_MAX_LAG', 10)  # seconds behind before reads fall back
+    app.config.setdefault('REPLICA_LAG_CHECK_INTERVAL', 5)  # seconds between lag checks
+    app.config.setdefault('REPLICA_HEARTBEAT_INTERVAL', 5)  # seconds between primary heartbeats
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)  # seconds a client reads from the primary after a write
+    health.max_lag = app.config['REPLICA_MAX_LAG']
+    health.check_interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+    health.heartbeat_interval = app.config['REPLICA_HEARTBEAT_INTERVAL']
+    health.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    from src.models.user import db
+    from src.utils.scheduler import scheduler, claim_run
+
+    app.after_request(mark_writes)
+    interval = app.config['REPLICA_HEARTBEAT_INTERVAL']
+    scheduler.add_job(HEARTBEAT_JOB, interval, lambda: claim_run(HEARTBEAT_JOB, interval))
+
+    @app.cli.command('sync-replica')
+    def sync_replica_command():
+        """Copy the primary SQLite database into the replica (local testing)."""
+        claim_run(HEARTBEAT_JOB, 0)
+        primary, replica = db.engine.url, db.engines[REPLICA_BIND].url
+        if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+            raise click.ClickException('sync-replica only copies SQLite files, use streaming replication otherwise')
+        copy_sqlite(primary.database, replica.database)
+        print(f'Copied {primary.database} to {replica.database}')
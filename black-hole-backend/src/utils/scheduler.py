@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from datetime import datetime
+import click
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, JobState
+
+
+class Scheduler:
+    """Runs periodic maintenance jobs on a daemon thread inside the app context.
+
+    The thread is started lazily by the first request of each process, so
+    workers forked from a preloaded app each get their own. Jobs must be
+    safe to run from several processes; use `claim_run` for the ones that
+    should run once per interval across all of them.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def add_job(self, name, interval, func):
+        self.jobs[name] = {'interval': interval, 'func': func, 'next_run': 0}
+
+    def run_job(self, app, name):
+        with app.app_context():
+            try:
+                return self.jobs[name]['func']()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Scheduled job %s failed', name)
+            finally:
+                db.session.remove()
+
+    def _loop(self, app):
+        while True:
+            now = time.monotonic()
+            for name, job in list(self.jobs.items()):
+                if now >= job['next_run']:
+                    job['next_run'] = now + job['interval']
+                    self.run_job(app, name)
+            time.sleep(1)
+
+    def ensure_started(self, app):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for job in self.jobs.values():
+                job['next_run'] = time.monotonic() + job['interval']
+            thread = threading.Thread(target=self._loop, args=(app,), name='scheduler', daemon=True)
+            thread.start()
+
+
+scheduler = Scheduler()
+
+
+def claim_run(name, interval):
+    """Atomically claim a job run, returns the previous run time or None.
+
+    Returns None when another process ran the job less than `interval`
+    seconds ago. The first claim records the run and returns `now`.
+    """
+    now = datetime.utcnow()
+    state = db.session.get(JobState, name)
+    if state is None:
+        try:
+            db.session.add(JobState(name=name, last_run_at=now))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        return now
+
+    previous = state.last_run_at
+    if (now - previous).total_seconds() < interval:
+        return None
+
+    claimed = db.session.execute(
+        db.update(JobState)
+        .where(JobState.name == name, JobState.last_run_at == previous)
+        .values(last_run_at=now)
+    ).rowcount
+    db.session.commit()
+    return previous if claimed else None
+
+
+def init_scheduler(app):
+    app.config.setdefault('SCHEDULER_ENABLED', True)
+
+    if app.config['SCHEDULER_ENABLED']:
+        @app.before_request
+        def start_scheduler():
+            scheduler.ensure_started(app)
+
+    @app.cli.command('run-job')
+    @click.argument('name')
+    def run_job_command(name):
+        """Run one scheduled job immediately."""
+        if name not in scheduler.jobs:
+            raise click.BadParameter(f'unknown job, choose from: {", ".join(sorted(scheduler.jobs))}')
+        print(scheduler.run_job(app, name))
@@ -0,0 +1,147 @@
+import bisect
+import re
+import threading
+import time
+from src.models.user import db, Manga
+
+SUGGEST_FIELDS = ('title', 'arabic_title', 'author', 'artist')
+
+# Harakat, superscript alef and tatweel carry no meaning for matching
+ARABIC_MARKS = re.compile('[\u064b-\u0652\u0670\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0622': '\u0627', '\u0671': '\u0627',  # alef forms
+    '\u0649': '\u064a', '\u0626': '\u064a',  # alef maqsura and yeh with hamza to yeh
+    '\u0624': '\u0648',  # waw with hamza to waw
+    '\u0629': '\u0647'  # teh marbuta to heh
+})
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize(text):
+    """Fold case, arabic letter variants and punctuation for prefix matching"""
+    text = ARABIC_MARKS.sub('', (text or '').casefold()).translate(ARABIC_LETTERS)
+    return ' '.join(PUNCTUATION.sub(' ', text).split())
+
+
+def _keys(row):
+    """Index keys of a manga: each field from its start and from every later word.
+
+    Keys from the start of a field rank before matches inside it.
+    """
+    keys = set()
+    for field in SUGGEST_FIELDS:
+        words = normalize(getattr(row, field)).split()
+        for position in range(len(words)):
+            keys.add((min(position, 1), ' '.join(words[position:])))
+    return keys
+
+
+class SuggestIndex:
+    """Sorted in-memory index over manga titles, authors and artists.
+
+    Keys are kept in two sorted lists, one for matches at the start of a
+    field and one for matches at a later word. A lookup is a binary search
+    into each followed by reading at most `limit` entries, so it never
+    touches the database. Admin writes in this process update the index in
+    place, other workers rebuild it when it is older than `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None  # one sorted list of (key, manga_id) per rank
+        self._keys = {}
+        self._cards = {}
+        self._built_at = 0
+
+    def _load(self):
+        rows = db.session.execute(
+            db.select(Manga.id, Manga.cover_image, *[getattr(Manga, field) for field in SUGGEST_FIELDS])
+        ).all()
+        entries, keys, cards = ([], []), {}, {}
+        for row in rows:
+            keys[row.id] = _keys(row)
+            cards[row.id] = self._card(row)
+            for rank, key in keys[row.id]:
+                entries[rank].append((key, row.id))
+        for ranked in entries:
+            ranked.sort()
+        return entries, keys, cards
+
+    @staticmethod
+    def _card(row):
+        return {
+            'id': row.id,
+            'title': row.title,
+            'arabic_title': row.arabic_title,
+            'cover_image': row.cover_image
+        }
+
+    def rebuild(self):
+        entries, keys, cards = self._load()
+        with self._lock:
+            self._entries, self._keys, self._cards = entries, keys, cards
+            self._built_at = time.monotonic()
+        return len(cards)
+
+    def _ensure_built(self):
+        if self._entries is None or time.monotonic() - self._built_at >= self.ttl:
+            self.rebuild()
+
+    def _remove_locked(self, manga_id):
+        for rank, key in self._keys.pop(manga_id, ()):
+            ranked = self._entries[rank]
+            position = bisect.bisect_left(ranked, (key, manga_id))
+            if position < len(ranked) and ranked[position] == (key, manga_id):
+                del ranked[position]
+        self._cards.pop(manga_id, None)
+
+    def upsert(self, manga):
+        """Re-index one manga after it was created or edited"""
+        with self._lock:
+            if self._entries is None:
+                return
+            self._remove_locked(manga.id)
+            self._keys[manga.id] = _keys(manga)
+            self._cards[manga.id] = self._card(manga)
+            for rank, key in self._keys[manga.id]:
+                bisect.insort(self._entries[rank], (key, manga.id))
+
+    def remove(self, manga_id):
+        with self._lock:
+            if self._entries is not None:
+                self._remove_locked(manga_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+    def search(self, query, limit=8):
+        """Return up to `limit` manga cards whose fields or words start with `query`"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_built()
+
+        results, seen = [], set()
+        with self._lock:
+            # Field start matches first, then word matches
+            for ranked in self._entries or ():
+                position = bisect.bisect_left(ranked, (prefix,))
+                while position < len(ranked) and ranked[position][0].startswith(prefix):
+                    manga_id = ranked[position][1]
+                    if manga_id not in seen:
+                        seen.add(manga_id)
+                        results.append(self._cards[manga_id])
+                        if len(results) == limit:
+                            return results
+                    position += 1
+        return results
+
+
+suggest_index = SuggestIndex()
+
+
+def init_suggest(app):
+    app.config.setdefault('SUGGEST_INDEX_TTL', 300)  # seconds
+    suggest_index.ttl = app.config['SUGGEST_INDEX_TTL']
@@ -0,0 +1,152 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from src.models.user import db, Chapter, Favorite, ReadingProgress, Rating, SyncTombstone
+from src.utils.scheduler import scheduler, claim_run
+
+# Re-send a small window on every sync so rows committed by transactions
+# that were still open when the previous token was issued are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Tokens older than this get a full resync instead of a delta
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+PRUNE_JOB = 'sync-tombstone-prune'
+
+
+def encode_token(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a sync token into naive UTC, raises ValueError when it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        moment = datetime.fromisoformat(base64.urlsafe_b64decode(padded).decode())
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('invalid sync token') from e
+    if moment.tzinfo is not None:
+        # Timestamps are stored as naive UTC, an offset would not compare with them
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def record_removal(user_id, entity, entity_id, manga_id=None):
+    db.session.add(SyncTombstone(
+        user_id=user_id,
+        entity=entity,
+        entity_id=entity_id,
+        manga_id=manga_id
+    ))
+
+
+def _record_bulk_removals(model, entity, condition, manga_id):
+    rows = db.select(
+        model.user_id,
+        db.literal(entity),
+        model.id,
+        db.literal(manga_id),
+        db.literal(datetime.utcnow())
+    ).where(condition)
+    db.session.execute(
+        db.insert(SyncTombstone).from_select(
+            ['user_id', 'entity', 'entity_id', 'manga_id', 'deleted_at'], rows
+        )
+    )
+
+
+def record_manga_removals(manga_id):
+    """Write tombstones for every user row that deleting a manga cascades to"""
+    chapter_ids = db.select(Chapter.id).where(Chapter.manga_id == manga_id)
+    _record_bulk_removals(Favorite, 'favorite', Favorite.manga_id == manga_id, manga_id)
+    _record_bulk_removals(ReadingProgress, 'reading_progress', ReadingProgress.manga_id == manga_id, manga_id)
+    _record_bulk_removals(
+        Rating, 'rating',
+        db.or_(Rating.manga_id == manga_id, Rating.chapter_id.in_(chapter_ids)),
+        manga_id
+    )
+
+
+def record_chapter_removals(chapter):
+    """Write tombstones for the chapter ratings removed with a chapter"""
+    _record_bulk_removals(Rating, 'rating', Rating.chapter_id == chapter.id, chapter.manga_id)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def collect_changes(user_id, since=None):
+    """Return the user's favorites, progress and ratings changed since `since`.
+
+    Without `since` (or with an expired one) everything is returned and
+    `reset` tells the client to replace its local copy.
+    """
+    now = datetime.utcnow()
+    reset = since is None or since < now - TOMBSTONE_RETENTION
+    lower_bound = None if reset else since - SYNC_OVERLAP
+
+    favorites = db.select(Favorite.id, Favorite.manga_id, Favorite.created_at).where(
+        Favorite.user_id == user_id
+    )
+    progress = db.select(
+        ReadingProgress.id, ReadingProgress.manga_id,
+        ReadingProgress.last_chapter_read, ReadingProgress.updated_at
+    ).where(ReadingProgress.user_id == user_id)
+    ratings = db.select(
+        Rating.id, Rating.manga_id, Rating.chapter_id, Rating.rating, Rating.updated_at
+    ).where(Rating.user_id == user_id)
+
+    removed = []
+    if lower_bound is not None:
+        favorites = favorites.where(Favorite.created_at >= lower_bound)
+        progress = progress.where(ReadingProgress.updated_at >= lower_bound)
+        ratings = ratings.where(Rating.updated_at >= lower_bound)
+        removed = SyncTombstone.query.filter(
+            SyncTombstone.user_id == user_id,
+            SyncTombstone.deleted_at >= lower_bound
+        ).all()
+
+    return {
+        'token': encode_token(now),
+        'reset': reset,
+        'favorites': [{
+            'id': row.id,
+            'manga_id': row.manga_id,
+            'created_at': _isoformat(row.created_at)
+        } for row in db.session.execute(favorites)],
+        'reading_progress': [{
+            'id': row.id,
+            'manga_id': row.manga_id,
+            'last_chapter_read': row.last_chapter_read,
+            'updated_at': _isoformat(row.updated_at)
+        } for row in db.session.execute(progress)],
+        'ratings': [{
+            'id': row.id,
+            'manga_id': row.manga_id,
+            'chapter_id': row.chapter_id,
+            'rating': row.rating,
+            'updated_at': _isoformat(row.updated_at)
+        } for row in db.session.execute(ratings)],
+        'removed': [tombstone.to_dict() for tombstone in removed]
+    }
+
+
+def prune_tombstones():
+    """Delete tombstones no delta sync can ask for anymore.
+
+    Tokens older than TOMBSTONE_RETENTION get a full resync, the overlap
+    keeps the rows the oldest accepted token still reads.
+    """
+    if claim_run(PRUNE_JOB, 3600) is None:
+        return 0
+    removed = db.session.execute(
+        db.delete(SyncTombstone).where(
+            SyncTombstone.deleted_at < datetime.utcnow() - TOMBSTONE_RETENTION - SYNC_OVERLAP
+        )
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def init_sync(app):
+    scheduler.add_job(PRUNE_JOB, 3600, prune_tombstones)
@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+import click
+from collections import OrderedDict
+from src.models.user import db, Manga, Tag, manga_tag
+
+# Genre strings use latin or arabic commas between names
+GENRE_SEPARATOR = re.compile(r'[,،]')
+
+
+def slugify(name):
+    return ' '.join(name.split()).lower()
+
+
+def split_genres(value):
+    """Split a genre string into unique (name, slug) pairs, keeping order"""
+    names = OrderedDict()
+    for name in GENRE_SEPARATOR.split(value or ''):
+        name = ' '.join(name.split())[:50]
+        if name:
+            names.setdefault(slugify(name), name)
+    return [(name, slug) for slug, name in names.items()]
+
+
+def get_or_create_tags(pairs):
+    """Return the Tag rows for (name, slug) pairs, creating missing ones"""
+    slugs = [slug for _, slug in pairs]
+    if not slugs:
+        return []
+    existing = {tag.slug: tag for tag in Tag.query.filter(Tag.slug.in_(slugs))}
+    tags = []
+    for name, slug in pairs:
+        tag = existing.get(slug)
+        if tag is None:
+            tag = existing[slug] = Tag(name=name, slug=slug)
+            db.session.add(tag)
+        tags.append(tag)
+    return tags
+
+
+def set_manga_tags(manga):
+    """Point the manga at the tags named in its genre string"""
+    manga.tags = get_or_create_tags(split_genres(manga.genre))
+
+
+def migrate_genres(only_untagged=True, batch_size=500):
+    """Build tag links from the genre strings, returns the number of manga tagged.
+
+    With `only_untagged` manga that already have tags are skipped, so the
+    migration is cheap to repeat on every start.
+    """
+    query = db.select(Manga.id).order_by(Manga.id)
+    if only_untagged:
+        query = query.where(~Manga.tags.any(), Manga.genre.isnot(None), Manga.genre != '')
+    manga_ids = db.session.execute(query).scalars().all()
+
+    for start in range(0, len(manga_ids), batch_size):
+        batch = Manga.query.filter(Manga.id.in_(manga_ids[start:start + batch_size])).all()
+        for manga in batch:
+            set_manga_tags(manga)
+        db.session.commit()
+
+    if manga_ids:
+        facets.invalidate()
+    return len(manga_ids)
+
+
+def tag_filter(slugs, match_all=True):
+    """Condition on Manga.id for manga tagged with all (or any) of `slugs`.
+
+    Resolved through the (tag_id, manga_id) index instead of scanning the
+    genre strings.
+    """
+    matching = db.select(manga_tag.c.manga_id).join(Tag, Tag.id == manga_tag.c.tag_id).where(
+        Tag.slug.in_(slugs)
+    )
+    if match_all and len(slugs) > 1:
+        matching = matching.group_by(manga_tag.c.manga_id).having(
+            db.func.count(manga_tag.c.tag_id) == len(slugs)
+        )
+    return Manga.id.in_(matching)
+
+
+def facet_counts(query):
+    """Count manga per genre and per status for a filtered Manga query.
+
+    All groups come back from one UNION ALL statement.
+    """
+    matched = query.with_entities(Manga.id, Manga.status).order_by(None).subquery()
+
+    total = db.select(
+        db.literal('total'), db.null(), db.func.count()
+    ).select_from(matched)
+    statuses = db.select(
+        db.literal('status'), matched.c.status, db.func.count()
+    ).group_by(matched.c.status)
+    genres = db.select(
+        db.literal('genre'), Tag.name, db.func.count()
+    ).select_from(matched).join(manga_tag, manga_tag.c.manga_id == matched.c.id).join(
+        Tag, Tag.id == manga_tag.c.tag_id
+    ).group_by(Tag.id, Tag.name)
+
+    result = {'total': 0, 'genres': [], 'statuses': []}
+    for facet, value, count in db.session.execute(db.union_all(total, statuses, genres)):
+        if facet == 'total':
+            result['total'] = count
+        elif facet == 'status':
+            result['statuses'].append({'status': value, 'count': count})
+        else:
+            result['genres'].append({'name': value, 'slug': slugify(value), 'count': count})
+
+    result['genres'].sort(key=lambda item: (-item['count'], item['name']))
+    result['statuses'].sort(key=lambda item: -item['count'])
+    return result
+
+
+class FacetCache:
+    """Facet counts per filter combination, dropped whenever the catalog changes.
+
+    Catalog writes in this process clear the cache immediately, other
+    workers pick them up when their entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, size=256, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+facets = FacetCache()
+
+
+def init_tags(app):
+    app.config.setdefault('FACETS_CACHE_SIZE', 256)  # filter combinations kept
+    app.config.setdefault('FACETS_CACHE_TTL', 300)  # seconds
+    facets.size = app.config['FACETS_CACHE_SIZE']
+    facets.ttl = app.config['FACETS_CACHE_TTL']
+
+    @app.cli.command('migrate-genres')
+    @click.option('--all', 'retag_all', is_flag=True, help='Re-tag manga that already have tags.')
+    def migrate_genres_command(retag_all):
+        """Build the genre tag table from the manga genre strings."""
+        print(f'Tagged {migrate_genres(only_untagged=not retag_all)} manga')
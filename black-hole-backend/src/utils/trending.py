@@ -0,0 +1,156 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from src.models.user import db, Manga, ActivityBucket, MangaScore, JobState
+from src.utils.scheduler import scheduler, claim_run
+
+# Weight of each reader signal in the popularity scores
+SIGNAL_WEIGHTS = {
+    'views': 1.0,
+    'reads': 2.0,
+    'ratings': 3.0,
+    'favorites': 5.0,
+}
+
+TRENDING_HALF_LIFE_HOURS = 24
+DECAY_JOB = 'trending-decay'
+
+# Buckets older than this are no longer needed by any window
+BUCKET_RETENTION = timedelta(days=8)
+
+
+def current_hour(moment=None):
+    return (moment or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+
+def decay_factor(hours):
+    return 0.5 ** (hours / TRENDING_HALF_LIFE_HOURS)
+
+
+class ActivityCounter:
+    """Per-process accumulator so request handlers never write activity rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: defaultdict(float))
+
+    def add(self, manga_id, signal, amount=1):
+        key = (int(manga_id), current_hour())
+        with self._lock:
+            self._counts[key][signal] += amount
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(lambda: defaultdict(float))
+        return counts
+
+
+activity = ActivityCounter()
+
+
+def record_activity(manga_id, signal, amount=1):
+    """Count a view, read, rating or favorite for the popularity scores"""
+    activity.add(manga_id, signal, amount)
+
+
+def _upsert(model, key, increments):
+    """Add `increments` to the row identified by `key`, creating it if missing"""
+    columns = {name: getattr(model, name) + value for name, value in increments.items()}
+    updated = db.session.execute(
+        db.update(model).filter_by(**key).values(**columns)
+    ).rowcount
+    if not updated:
+        db.session.add(model(**key, **increments))
+
+
+def flush_activity():
+    """Write this process's counts into the hourly buckets and the scores.
+
+    Trending is stored as of the last decay run, so new activity is scaled
+    by its age relative to that moment. Returns the number of buckets.
+    """
+    counts = activity.drain()
+    if not counts:
+        return 0
+
+    state = db.session.get(JobState, DECAY_JOB)
+    decayed_at = state.last_run_at if state else datetime.utcnow()
+
+    for (manga_id, hour), signals in counts.items():
+        score = sum(SIGNAL_WEIGHTS[signal] * amount for signal, amount in signals.items())
+        bucket_counts = {signal: int(amount) for signal, amount in signals.items()}
+        _upsert(ActivityBucket, {'manga_id': manga_id, 'hour': hour}, {**bucket_counts, 'score': score})
+
+        age_hours = (decayed_at - hour).total_seconds() / 3600
+        _upsert(MangaScore, {'manga_id': manga_id}, {
+            'trending': score * decay_factor(age_hours),
+            'popular_all': score
+        })
+
+    db.session.commit()
+    return len(counts)
+
+
+def decay_trending():
+    """Decay every trending score by the time elapsed since the last run"""
+    previous = claim_run(DECAY_JOB, 3600 - 60)
+    if previous is None:
+        return 0
+
+    now = db.session.get(JobState, DECAY_JOB).last_run_at
+    factor = decay_factor((now - previous).total_seconds() / 3600)
+    if factor >= 1:
+        return 0
+
+    updated = db.session.execute(
+        db.update(MangaScore).values(trending=MangaScore.trending * factor)
+    ).rowcount
+    db.session.commit()
+    return updated
+
+
+def ensure_scores():
+    """Give every manga a score row, the ranked lists inner join on it.
+
+    Manga created by the admin routes get theirs right away, this catches
+    imports and rows written outside the app. The caller commits.
+    """
+    missing = db.select(
+        Manga.id, db.literal(0.0), db.literal(0.0), db.literal(0.0), db.literal(0.0), db.literal(datetime.utcnow())
+    ).where(~db.select(MangaScore.manga_id).where(MangaScore.manga_id == Manga.id).exists())
+    db.session.execute(db.insert(MangaScore).from_select(
+        ['manga_id', 'trending', 'popular_daily', 'popular_weekly', 'popular_all', 'updated_at'], missing
+    ))
+
+
+def refresh_windows():
+    """Recompute the daily and weekly sums from the buckets inside each window"""
+    now = datetime.utcnow()
+    ensure_scores()
+
+    def window_sum(hours):
+        return db.select(db.func.coalesce(db.func.sum(ActivityBucket.score), 0)).where(
+            ActivityBucket.manga_id == MangaScore.manga_id,
+            ActivityBucket.hour >= current_hour(now - timedelta(hours=hours))
+        ).scalar_subquery()
+
+    db.session.execute(db.update(MangaScore).values(
+        popular_daily=window_sum(24),
+        popular_weekly=window_sum(24 * 7)
+    ))
+    db.session.execute(
+        db.delete(ActivityBucket).where(ActivityBucket.hour < now - BUCKET_RETENTION)
+    )
+    db.session.commit()
+
+
+def remove_manga(manga_id):
+    db.session.execute(db.delete(ActivityBucket).where(ActivityBucket.manga_id == manga_id))
+
+
+def init_trending(app):
+    app.config.setdefault('TRENDING_FLUSH_INTERVAL', 60)  # seconds
+    app.config.setdefault('TRENDING_WINDOW_INTERVAL', 600)  # seconds
+    scheduler.add_job('trending-flush', app.config['TRENDING_FLUSH_INTERVAL'], flush_activity)
+    scheduler.add_job(DECAY_JOB, 300, decay_trending)
+    scheduler.add_job('trending-windows', app.config['TRENDING_WINDOW_INTERVAL'], refresh_windows)
@@ -0,0 +1,159 @@
+import atexit
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from src.models.user import db, Manga, Chapter, ChapterViewBucket
+from src.utils.scheduler import scheduler, claim_run
+from src.utils.trending import current_hour
+
+FLUSH_JOB = 'views-flush'
+PRUNE_JOB = 'views-prune'
+
+
+class ViewCounter:
+    """Per-process view counts, written to the database in batches.
+
+    Views are only added up in memory on the request path. The flush job
+    turns them into one `views = views + ?` UPDATE per table plus one
+    upsert per chapter and hour. A process that dies without flushing
+    loses at most VIEWS_FLUSH_INTERVAL seconds of its own views.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manga = Counter()
+        self._chapters = Counter()
+
+    def add(self, manga_id, chapter_id=None):
+        with self._lock:
+            self._manga[int(manga_id)] += 1
+            if chapter_id is not None:
+                self._chapters[(int(chapter_id), int(manga_id), current_hour())] += 1
+
+    def drain(self):
+        with self._lock:
+            manga, self._manga = self._manga, Counter()
+            chapters, self._chapters = self._chapters, Counter()
+        return manga, chapters
+
+    def restore(self, manga, chapters):
+        """Put drained counts back after a failed flush"""
+        with self._lock:
+            self._manga.update(manga)
+            self._chapters.update(chapters)
+
+    def pending(self):
+        with self._lock:
+            return sum(self._manga.values())
+
+
+views = ViewCounter()
+
+
+def record_view(manga_id, chapter_id=None):
+    """Count a view of a manga page, or of one of its chapters"""
+    views.add(manga_id, chapter_id)
+
+
+def _add_views(table, counts):
+    """Add counts to the views column of `table` in one executemany UPDATE.
+
+    updated_at is kept so views do not reorder the "recently updated" lists.
+    """
+    if not counts:
+        return
+    db.session.execute(
+        db.update(table)
+        .where(table.c.id == db.bindparam('row_id'))
+        .values(views=table.c.views + db.bindparam('added'), updated_at=table.c.updated_at),
+        [{'row_id': row_id, 'added': added} for row_id, added in counts.items()]
+    )
+
+
+def flush_views():
+    """Write this process's view counts, returns the number of views written"""
+    manga, chapters = views.drain()
+    if not manga:
+        return 0
+
+    try:
+        chapter_totals = Counter()
+        for (chapter_id, _, _), added in chapters.items():
+            chapter_totals[chapter_id] += added
+
+        _add_views(Manga.__table__, manga)
+        _add_views(Chapter.__table__, chapter_totals)
+
+        # Buckets for chapters deleted since the view would be orphans
+        existing = set(db.session.scalars(db.select(Chapter.id).where(Chapter.id.in_(chapter_totals))))
+        for (chapter_id, manga_id, hour), added in chapters.items():
+            if chapter_id not in existing:
+                continue
+            updated = db.session.execute(
+                db.update(ChapterViewBucket)
+                .filter_by(chapter_id=chapter_id, hour=hour)
+                .values(views=ChapterViewBucket.views + added)
+            ).rowcount
+            if not updated:
+                db.session.add(ChapterViewBucket(chapter_id=chapter_id, manga_id=manga_id, hour=hour, views=added))
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        views.restore(manga, chapters)
+        raise
+
+    return sum(manga.values())
+
+
+def prune_view_buckets(retention_days):
+    """Delete hourly chapter buckets older than the retention period"""
+    if claim_run(PRUNE_JOB, 3600) is None:
+        return 0
+    removed = db.session.execute(
+        db.delete(ChapterViewBucket).where(
+            ChapterViewBucket.hour < current_hour() - timedelta(days=retention_days)
+        )
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def hourly_views(manga_id, hours):
+    """Views per hour of a manga's chapters over the last `hours` hours"""
+    since = current_hour(datetime.utcnow() - timedelta(hours=hours - 1))
+    rows = db.session.execute(
+        db.select(ChapterViewBucket.hour, db.func.sum(ChapterViewBucket.views))
+        .where(ChapterViewBucket.manga_id == manga_id, ChapterViewBucket.hour >= since)
+        .group_by(ChapterViewBucket.hour)
+        .order_by(ChapterViewBucket.hour)
+    ).all()
+    return [{'hour': hour.isoformat(), 'views': int(count)} for hour, count in rows]
+
+
+def chapter_views(manga_id, hours):
+    """Views per chapter of a manga over the last `hours` hours, most viewed first"""
+    since = current_hour(datetime.utcnow() - timedelta(hours=hours - 1))
+    total = db.func.sum(ChapterViewBucket.views)
+    rows = db.session.execute(
+        db.select(ChapterViewBucket.chapter_id, Chapter.chapter_number, total)
+        .join(Chapter, Chapter.id == ChapterViewBucket.chapter_id)
+        .where(ChapterViewBucket.manga_id == manga_id, ChapterViewBucket.hour >= since)
+        .group_by(ChapterViewBucket.chapter_id, Chapter.chapter_number)
+        .order_by(total.desc())
+    ).all()
+    return [
+        {'chapter_id': chapter_id, 'chapter_number': number, 'views': int(count)}
+        for chapter_id, number, count in rows
+    ]
+
+
+def init_views(app):
+    app.config.setdefault('VIEWS_FLUSH_INTERVAL', 30)  # seconds, the most views a crash can lose
+    app.config.setdefault('VIEWS_BUCKET_RETENTION_DAYS', 90)  # days of hourly chapter views kept
+    retention = app.config['VIEWS_BUCKET_RETENTION_DAYS']
+    scheduler.add_job(FLUSH_JOB, app.config['VIEWS_FLUSH_INTERVAL'], flush_views)
+    scheduler.add_job(PRUNE_JOB, 3600, lambda: prune_view_buckets(retention))
+
+    # Clean shutdowns write what is left, only a hard crash loses counts
+    atexit.register(lambda: views.pending() and scheduler.run_job(app, FLUSH_JOB))
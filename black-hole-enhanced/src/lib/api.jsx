@@ -50,7 +50,11 @@ export const authAPI = {
 // Manga API
 export const mangaAPI = {
   getList: (params) => api.get('/manga', { params }),
+  getLatestUpdates: (params) => api.get('/manga/latest-updates', { params }),
+  getFacets: (params) => api.get('/manga/facets', { params }),
+  suggest: (q) => api.get('/manga/suggest', { params: { q } }),
   getDetails: (id) => api.get(`/manga/${id}`),
+  getChapters: (id, params) => api.get(`/manga/${id}/chapters`, { params }),
   getChapter: (mangaId, chapterId) => api.get(`/manga/${mangaId}/chapters/${chapterId}`),
   rateManga: (id, rating) => api.post(`/manga/${id}/rate`, { rating }),
   rateChapter: (mangaId, chapterId, rating) => api.post(`/manga/${mangaId}/chapters/${chapterId}/rate`, { rating }),
@@ -59,6 +63,7 @@ export const mangaAPI = {
   toggleFavorite: (id) => api.post(`/manga/${id}/favorite`),
   getFavorites: (params) => api.get('/manga/favorites', { params }),
   getReadingProgress: (params) => api.get('/manga/reading-progress', { params }),
+  sync: (since) => api.get('/manga/sync', { params: { since } }),
 };
 
 // Admin API
@@ -79,6 +84,22 @@ export const adminAPI = {
   promoteUser: (id) => api.post(`/admin/users/${id}/promote`),
 };
 
+// Notifications API
+export const notificationsAPI = {
+  getList: (params) => api.get('/notifications', { params }),
+  getUnreadCount: () => api.get('/notifications/unread-count'),
+  markAllRead: () => api.post('/notifications/read'),
+  markRead: (id) => api.post(`/notifications/${id}/read`),
+};
+
+// Batch API: several manga/auth GET requests in one round trip.
+// Takes [{ id, path, params }], resolves to { [id]: { status, body } }
+export const batchAPI = {
+  run: (requests) => api.post('/batch/', { requests }).then((response) =>
+    Object.fromEntries(response.data.responses.map(({ id, status, body }) => [id, { status, body }]))
+  ),
+};
+
 // User API
 export const userAPI = {
   getList: (params) => api.get('/users', { params }),
@@ -121,14 +121,14 @@ const ChapterPage = () => {
   }, [currentImageIndex]);
 
   const handlePrevChapter = () => {
-    if (chapter?.chapter_number > 1) {
-      navigate(`/manga/${mangaId}/chapter/${parseInt(chapterId) - 1}`);
+    if (chapter?.previous_chapter) {
+      navigate(`/manga/${mangaId}/chapter/${chapter.previous_chapter.id}`);
     }
   };
 
   const handleNextChapter = () => {
-    if (chapter?.chapter_number < chapter?.manga?.total_chapters) {
-      navigate(`/manga/${mangaId}/chapter/${parseInt(chapterId) + 1}`);
+    if (chapter?.next_chapter) {
+      navigate(`/manga/${mangaId}/chapter/${chapter.next_chapter.id}`);
     }
   };
 
@@ -229,7 +229,7 @@ const ChapterPage = () => {
                 variant="outline"
                 size="sm"
                 onClick={handlePrevChapter}
-                disabled={chapter.chapter_number <= 1}
+                disabled={!chapter.previous_chapter}
               >
                 <ArrowRight className="h-4 w-4" />
                 السابق
@@ -238,7 +238,7 @@ const ChapterPage = () => {
                 variant="outline"
                 size="sm"
                 onClick={handleNextChapter}
-                disabled={chapter.chapter_number >= chapter.manga?.total_chapters}
+                disabled={!chapter.next_chapter}
               >
                 التالي
                 <ArrowLeft className="h-4 w-4" />
@@ -277,7 +277,7 @@ const ChapterPage = () => {
             <div className="flex justify-center space-x-4 space-x-reverse">
               <Button
                 onClick={handlePrevChapter}
-                disabled={chapter.chapter_number <= 1}
+                disabled={!chapter.previous_chapter}
                 size="lg"
               >
                 <ArrowRight className="h-5 w-5 ml-2" />
@@ -285,7 +285,7 @@ const ChapterPage = () => {
               </Button>
               <Button
                 onClick={handleNextChapter}
-                disabled={chapter.chapter_number >= chapter.manga?.total_chapters}
+                disabled={!chapter.next_chapter}
                 size="lg"
               >
                 الفصل التالي
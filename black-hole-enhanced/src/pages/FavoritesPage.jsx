@@ -61,7 +61,8 @@ const FavoritesPage = () => {
     queryFn: () => mangaAPI.getFavorites({
       search: searchQuery,
       sort_by: sortBy,
-      status: filterStatus
+      status: filterStatus,
+      fields: 'card,description'
     }),
     select: (data) => data.data.favorites || sampleFavorites,
     enabled: isAuthenticated
@@ -4,7 +4,7 @@ import { useQuery } from '@tanstack/react-query';
 import { Star, Clock, Eye, ArrowLeft, BookOpen, TrendingUp } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
-import { mangaAPI } from '../lib/api';
+import { batchAPI } from '../lib/api';
 import LoadingSpinner from '../components/LoadingSpinner';
 import { formatDate } from '../lib/auth';
 
@@ -59,19 +59,18 @@ const sampleManga = [
 const HomePage = () => {
   const [featuredManga, setFeaturedManga] = useState(sampleManga[0]);
 
-  // Fetch latest manga
-  const { data: latestManga, isLoading: latestLoading } = useQuery({
-    queryKey: ['manga', 'latest'],
-    queryFn: () => mangaAPI.getList({ sort_by: 'updated_at', per_page: 8 }),
-    select: (data) => data.data.manga || sampleManga,
-  });
-
-  // Fetch popular manga
-  const { data: popularManga, isLoading: popularLoading } = useQuery({
-    queryKey: ['manga', 'popular'],
-    queryFn: () => mangaAPI.getList({ sort_by: 'rating', per_page: 6 }),
-    select: (data) => data.data.manga || sampleManga.slice(0, 6),
+  // Fetch latest and popular manga in one round trip
+  const { data: homeLists, isLoading: listsLoading } = useQuery({
+    queryKey: ['manga', 'home'],
+    queryFn: () => batchAPI.run([
+      { id: 'latest', path: '/api/manga/', params: { sort_by: 'updated_at', per_page: 8 } },
+      { id: 'popular', path: '/api/manga/', params: { sort_by: 'popular', window: 'weekly', per_page: 6 } },
+    ]),
   });
+  const latestManga = homeLists?.latest?.body?.manga || sampleManga;
+  const popularManga = homeLists?.popular?.body?.manga || sampleManga.slice(0, 6);
+  const latestLoading = listsLoading;
+  const popularLoading = listsLoading;
 
   // Rotate featured manga every 5 seconds
   useEffect(() => {
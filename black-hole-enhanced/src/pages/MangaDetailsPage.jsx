@@ -1,6 +1,6 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useMutation, useQueryClient, keepPreviousData } from '@tanstack/react-query';
 import { Star, Heart, BookOpen, Clock, User, MessageCircle, ThumbsUp, Share2, Eye, Calendar } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
@@ -55,6 +55,8 @@ const sampleManga = {
   reading_progress: null
 };
 
+const CHAPTERS_PER_PAGE = 50;
+
 const MangaDetailsPage = () => {
   const { id } = useParams();
   const { user, isAuthenticated } = useAuth();
@@ -62,6 +64,9 @@ const MangaDetailsPage = () => {
   const [reviewText, setReviewText] = useState('');
   const [reviewRating, setReviewRating] = useState(5);
   const [showReviewForm, setShowReviewForm] = useState(false);
+  const [chapterPage, setChapterPage] = useState(1);
+
+  useEffect(() => setChapterPage(1), [id]);
 
   // Fetch manga details
   const { data: manga, isLoading } = useQuery({
@@ -70,6 +75,17 @@ const MangaDetailsPage = () => {
     select: (data) => data.data.manga || sampleManga,
   });
 
+  // The details response only carries the newest chapters, the full list is paged
+  const { data: chapterData, isFetching: chaptersFetching } = useQuery({
+    queryKey: ['manga', id, 'chapters', chapterPage],
+    queryFn: () => mangaAPI.getChapters(id, { page: chapterPage, per_page: CHAPTERS_PER_PAGE, order: 'desc' }),
+    select: (data) => data.data,
+    placeholderData: keepPreviousData,
+  });
+
+  const chapters = chapterData?.chapters || manga?.chapters || [];
+  const chapterPagination = chapterData?.pagination;
+
   // Rate manga mutation
   const rateMutation = useMutation({
     mutationFn: (rating) => mangaAPI.rateManga(id, rating),
@@ -250,7 +266,7 @@ const MangaDetailsPage = () => {
           {/* Action Buttons */}
           <div className="flex flex-wrap gap-3">
             <Button asChild size="lg" className="neon-glow">
-              <Link to={`/manga/${manga.id}/chapter/${manga.chapters?.[0]?.id || 1}`}>
+              <Link to={`/manga/${manga.id}/chapter/${manga.first_chapter?.id || 1}`}>
                 <BookOpen className="ml-2 h-5 w-5" />
                 بدء القراءة
               </Link>
@@ -345,12 +361,12 @@ const MangaDetailsPage = () => {
         <CardHeader>
           <CardTitle className="flex items-center justify-between">
             <span>قائمة الفصول</span>
-            <Badge>{manga.chapters?.length || 0} فصل</Badge>
+            <Badge>{manga.total_chapters || 0} فصل</Badge>
           </CardTitle>
         </CardHeader>
         <CardContent>
           <div className="space-y-2 max-h-96 overflow-y-auto">
-            {manga.chapters?.map((chapter) => (
+            {chapters.map((chapter) => (
               <Link
                 key={chapter.id}
                 to={`/manga/${manga.id}/chapter/${chapter.id}`}
@@ -376,6 +392,29 @@ const MangaDetailsPage = () => {
               </Link>
             ))}
           </div>
+          {chapterPagination && chapterPagination.pages > 1 && (
+            <div className="flex items-center justify-between mt-4">
+              <Button
+                variant="outline"
+                size="sm"
+                disabled={!chapterPagination.has_prev || chaptersFetching}
+                onClick={() => setChapterPage((page) => page - 1)}
+              >
+                الأحدث
+              </Button>
+              <span className="text-sm text-muted-foreground">
+                صفحة {chapterPagination.page} من {chapterPagination.pages}
+              </span>
+              <Button
+                variant="outline"
+                size="sm"
+                disabled={!chapterPagination.has_next || chaptersFetching}
+                onClick={() => setChapterPage((page) => page + 1)}
+              >
+                الأقدم
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
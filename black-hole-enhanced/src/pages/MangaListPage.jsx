@@ -82,6 +82,21 @@ const MangaListPage = () => {
 
   // Local state for form inputs
   const [searchInput, setSearchInput] = useState(currentSearch);
+  const [suggestQuery, setSuggestQuery] = useState('');
+
+  // Wait for a short pause in typing before asking for suggestions
+  useEffect(() => {
+    const timer = setTimeout(() => setSuggestQuery(searchInput.trim()), 150);
+    return () => clearTimeout(timer);
+  }, [searchInput]);
+
+  const { data: suggestions } = useQuery({
+    queryKey: ['manga', 'suggest', suggestQuery],
+    queryFn: () => mangaAPI.suggest(suggestQuery),
+    enabled: suggestQuery.length > 0 && suggestQuery !== currentSearch,
+    select: (data) => data.data?.suggestions || [],
+    staleTime: 60 * 1000,
+  });
 
   // Fetch manga list
   const { data, isLoading, error } = useQuery({
@@ -92,7 +107,8 @@ const MangaListPage = () => {
       status: currentStatus,
       sort_by: currentSort,
       page: currentPage,
-      per_page: 20
+      per_page: 20,
+      fields: 'card,description'
     }),
     select: (data) => data.data || { manga: sampleManga, pagination: { total: 4, pages: 1 } },
   });
@@ -237,6 +253,23 @@ const MangaListPage = () => {
               onChange={(e) => setSearchInput(e.target.value)}
               className="pr-10"
             />
+            {suggestions?.length > 0 && searchInput.trim() !== currentSearch && (
+              <div className="absolute z-20 mt-1 w-full rounded-md border bg-popover shadow-md">
+                {suggestions.map((item) => (
+                  <Link
+                    key={item.id}
+                    to={`/manga/${item.id}`}
+                    className="flex items-center gap-3 px-3 py-2 hover:bg-accent/10"
+                  >
+                    <img src={item.cover_image} alt={item.arabic_title} className="h-10 w-8 rounded object-cover" />
+                    <div className="min-w-0">
+                      <p className="text-sm font-medium truncate">{item.arabic_title}</p>
+                      <p className="text-xs text-muted-foreground truncate">{item.title}</p>
+                    </div>
+                  </Link>
+                ))}
+              </div>
+            )}
           </div>
           <Button type="submit">بحث</Button>
           <Button
@@ -294,6 +327,7 @@ const MangaListPage = () => {
                     <SelectItem value="updated_at">آخر تحديث</SelectItem>
                     <SelectItem value="rating">التقييم</SelectItem>
                     <SelectItem value="title">الاسم</SelectItem>
+                    <SelectItem value="views">الأكثر مشاهدة</SelectItem>
                     <SelectItem value="created_at">تاريخ الإضافة</SelectItem>
                   </SelectContent>
                 </Select>